@@ -0,0 +1,115 @@
+import time
+import zlib
+import logging
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+import numpy as np
+
+# Configure Logging
+logger = logging.getLogger("FakeLlama")
+
+def _spend(seconds: float):
+    if seconds > 0:
+        time.sleep(seconds)
+
+class FakeLlama:
+    """
+    Deterministic stand-in for llama_cpp.Llama, for benchmarks without a model.
+    Tokens are CRC32 ids of whitespace-separated words, embeddings are means
+    of fixed per-token vectors, and generation replays a fixed text. The
+    per-token costs (seconds) are slept so results keep the shape of a real
+    run. Prompt evaluation reuses the longest prefix already evaluated, like
+    llama.cpp's KV cache.
+    """
+    REPLY = ("The lattice converges on the ingested sources and the graft steers "
+             "the value projections toward their shared direction. ")
+
+    def __init__(self, n_embd: int = 512, n_ctx: int = 4096, n_vocab: int = 32000,
+                 embed_cost: float = 0.0, prompt_cost: float = 0.0, token_cost: float = 0.0,
+                 seed: int = 0):
+        self._n_embd = n_embd
+        self._n_ctx = n_ctx
+        self._n_vocab = n_vocab
+        self.embed_cost = embed_cost
+        self.prompt_cost = prompt_cost
+        self.token_cost = token_cost
+        self.cache = None
+        self._words: Dict[int, bytes] = {}
+        self._input_ids: List[int] = []
+        # 4096 buckets keep the table small; collisions do not matter for timing
+        self._table = np.random.default_rng(seed).standard_normal((4096, n_embd)).astype(np.float32)
+
+    def n_embd(self) -> int:
+        return self._n_embd
+
+    def n_ctx(self) -> int:
+        return self._n_ctx
+
+    @property
+    def n_tokens(self) -> int:
+        return len(self._input_ids)
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        tokens = [1] if add_bos else []
+        for word in text.split():
+            token = 2 + zlib.crc32(word) % (self._n_vocab - 2)
+            self._words.setdefault(token, word)
+            tokens.append(token)
+        return tokens
+
+    def detokenize(self, tokens: Sequence[int], *args, **kwargs) -> bytes:
+        return b" ".join(self._words.get(t, b"") for t in tokens if t != 1)
+
+    def reset(self):
+        self._input_ids = []
+
+    def set_cache(self, cache):
+        self.cache = cache
+
+    def embed(self, input: Union[str, List[str]], normalize: bool = False, truncate: bool = True):
+        texts = [input] if isinstance(input, str) else input
+        vectors = []
+        for text in texts:
+            tokens = self.tokenize(text.encode("utf-8"))
+            if truncate:
+                tokens = tokens[:self._n_ctx]
+            _spend(self.embed_cost * len(tokens))
+            vec = self._table[np.asarray(tokens) % len(self._table)].mean(axis=0)
+            if normalize:
+                vec = vec / max(float(np.linalg.norm(vec)), 1e-12)
+            vectors.append(vec.tolist())
+        return vectors[0] if isinstance(input, str) else vectors
+
+    def eval(self, tokens: Sequence[int]):
+        _spend(self.prompt_cost * len(tokens))
+        self._input_ids.extend(tokens)
+
+    def _eval_prompt(self, prompt: List[int]):
+        shared = 0
+        for a, b in zip(self._input_ids, prompt):
+            if a != b:
+                break
+            shared += 1
+        del self._input_ids[shared:]
+        self.eval(prompt[shared:])
+
+    def _stream(self, max_tokens: int) -> Iterator[dict]:
+        words = self.REPLY.split()
+        for i in range(max_tokens):
+            _spend(self.token_cost)
+            text = words[i % len(words)] + " "
+            self._input_ids.extend(self.tokenize(text.encode("utf-8"), add_bos=False))
+            finish = "length" if i == max_tokens - 1 else None
+            yield {"choices": [{"text": text, "index": 0, "finish_reason": finish}]}
+
+    def __call__(self, prompt: Union[str, List[int]], max_tokens: Optional[int] = 16,
+                 stop=None, stream: bool = False, **kwargs):
+        if isinstance(prompt, str):
+            prompt = self.tokenize(prompt.encode("utf-8"))
+        self._eval_prompt(list(prompt))
+        chunks = self._stream(max_tokens or 16)
+        if stream:
+            return chunks
+        text = "".join(c["choices"][0]["text"] for c in chunks)
+        return {"choices": [{"text": text, "index": 0, "finish_reason": "length"}]}
+
+    create_completion = __call__
@@ -0,0 +1,424 @@
+"""
+Genesis X pipeline benchmarks.
+
+    python -m bench.run                       # stub backend, no model needed
+    python -m bench.run --model models/x.gguf # real llama.cpp model
+    python -m bench.run --out bench.json --stages parse,concept
+
+Every stage is timed over --repeat runs and the results are written as one
+JSON document, so runs from different releases can be diffed stage by stage.
+"""
+import os
+import sys
+import json
+import math
+import time
+import wave
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from array import array
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Runnable from anywhere; imports resolve against the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SCHEMA_VERSION = 1
+STAGES = ("parse", "concept", "lora", "chat")
+
+logger = logging.getLogger("Bench")
+
+# --- Helpers ---
+
+def _timed(fn: Callable, repeat: int):
+    """
+    Runs fn `repeat` times; returns (last result, timing stats in seconds).
+    """
+    times, result = [], None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, {
+        "runs": len(times),
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+    }
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+# --- Fixtures ---
+
+_WORDS = ("spectral lattice graft adapter tensor corpus vector weight model layer "
+          "projection concept embedding token context rank alpha analytic steering "
+          "residual stream attention value output matrix source chunk").split()
+
+def _prose(rng: random.Random, n_chars: int) -> str:
+    lines, size = [], 0
+    while size < n_chars:
+        line = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _write_pdf(path: str, lines: List[str], lines_per_page: int = 60):
+    """
+    Minimal text-only PDF (Helvetica, one content stream per page), so the
+    docling path is benchmarked without a PDF library.
+    """
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        text = "".join(f"({_pdf_escape(line)}) Tj T* " for line in page)
+        stream = f"BT /F1 10 Tf 12 TL 50 780 Td {text}ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1", errors="replace")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode("ascii")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    with open(path, "wb") as f:
+        f.write(out)
+
+def make_samples(sample_dir: str, corpus_kb: int) -> Dict[str, str]:
+    """
+    Writes one deterministic sample per benchmarked format; returns {format: path}.
+    """
+    rng = random.Random(0)
+    n_chars = corpus_kb * 1024
+    samples = {}
+
+    def write(ext, text):
+        path = os.path.join(sample_dir, f"sample{ext}")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        samples[ext] = path
+
+    write(".txt", _prose(rng, n_chars))
+    write(".md", "# Sample\n\n" + _prose(rng, n_chars))
+    write(".py", "\n".join(f"def f{i}(x):\n    return x * {i}  # {rng.choice(_WORDS)}\n"
+                           for i in range(max(1, n_chars // 48))))
+    write(".json", json.dumps([{"id": i, "term": rng.choice(_WORDS), "score": rng.random()}
+                               for i in range(max(1, n_chars // 48))], indent=1))
+    rows = max(1, n_chars // 40)
+    for ext, sep in ((".csv", ","), (".tsv", "\t")):
+        write(ext, f"id{sep}term{sep}score{sep}weight\n" + "\n".join(
+            f"{i}{sep}{rng.choice(_WORDS)}{sep}{rng.random():.6f}{sep}{rng.randint(0, 999)}"
+            for i in range(rows)) + "\n")
+    path = os.path.join(sample_dir, "sample.pdf")
+    _write_pdf(path, _prose(rng, n_chars).splitlines())
+    samples[".pdf"] = path
+    body = "".join(f"<p>{line}</p>\n" for line in _prose(rng, n_chars).splitlines())
+    write(".html", f"<html><head><style>p {{}}</style></head><body>{body}</body></html>")
+
+    try:
+        import pandas as pd
+        path = os.path.join(sample_dir, "sample.xlsx")
+        pd.DataFrame({"term": [rng.choice(_WORDS) for _ in range(rows)],
+                      "score": [rng.random() for _ in range(rows)]}).to_excel(path, index=False)
+        samples[".xlsx"] = path
+    except Exception as e:
+        logger.warning(f"Skipping .xlsx sample: {e}")
+
+    # 5 s mono 16-bit sine sweep
+    path = os.path.join(sample_dir, "sample.wav")
+    rate = 22050
+    pcm = array("h", (int(12000 * math.sin(2 * math.pi * (220 + i / 100) * i / rate))
+                      for i in range(rate * 5)))
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    samples[".wav"] = path
+    return samples
+
+def write_stub_model(path: str, n_embd: int, n_layers: int, n_head: int, n_head_kv: int):
+    """
+    Writes a GGUF with real llama metadata and zeroed attention tensors, enough
+    for model introspection and adapter synthesis (not for inference).
+    """
+    import gguf
+    import numpy as np
+    kv_dim = n_embd // n_head * n_head_kv
+    gw = gguf.GGUFWriter(path, "llama")
+    gw.add_name("genesis-bench-stub")
+    gw.add_block_count(n_layers)
+    gw.add_embedding_length(n_embd)
+    gw.add_context_length(4096)
+    gw.add_head_count(n_head)
+    gw.add_head_count_kv(n_head_kv)
+    for i in range(n_layers):
+        # numpy (n_out, n_in) -> GGUF (n_in, n_out)
+        gw.add_tensor(f"blk.{i}.attn_v.weight", np.zeros((kv_dim, n_embd), dtype=np.float16))
+        gw.add_tensor(f"blk.{i}.attn_output.weight", np.zeros((n_embd, n_embd), dtype=np.float16))
+    gw.write_header_to_file()
+    gw.write_kv_data_to_file()
+    gw.write_tensors_to_file()
+    gw.close()
+    return path
+
+def build_manager(args, model_path: str):
+    from core.model_manager import ModelManager
+    if args.model:
+        return ModelManager(model_path, n_ctx=args.n_ctx, n_batch=args.n_batch)
+    from bench.fake_llama import FakeLlama
+    llm = FakeLlama(n_embd=args.embd, n_ctx=args.n_ctx, embed_cost=args.embed_cost,
+                    prompt_cost=args.prompt_cost, token_cost=args.token_cost)
+    return ModelManager(model_path, n_ctx=args.n_ctx, n_batch=args.n_batch,
+                        prompt_cache_bytes=0, llm=llm)
+
+# --- Stages ---
+
+def bench_parse(samples: Dict[str, str], repeat: int) -> Dict[str, dict]:
+    """
+    OmniParser.parse_file per format, uncached.
+    """
+    from core.omni_parser import OmniParser
+    parser = OmniParser(cache=None)
+    results = {}
+    for ext, path in sorted(samples.items()):
+        text, stats = _timed(lambda: parser.parse_file(path), repeat)
+        size = os.path.getsize(path)
+        stats.update({
+            "file": os.path.basename(path),
+            "bytes": size,
+            "chars_out": len(text),
+            "mb_per_s": size / 1024**2 / stats["median_s"] if stats["median_s"] else None,
+            "error": text.startswith(OmniParser.ERROR_PREFIX) or not text,
+            # Without docling, PDFs go through the pypdf / raw-text fallback
+            "degraded": ext == ".pdf" and parser._get_docling() is None,
+        })
+        results[ext] = stats
+    return results
+
+def bench_concept(engine, text: str, repeat: int) -> Tuple[dict, "np.ndarray"]:
+    """
+    calculate_concept_vector on the .txt sample, without and with the embedding cache.
+    Returns the results and the concept vector (input to the lora stage).
+    """
+    n_tokens = len(engine.llm.tokenize(text.encode("utf-8"), add_bos=False))
+    results = {"chars": len(text), "tokens": n_tokens}
+
+    cache, engine.embedder.cache = engine.embedder.cache, None
+    vector, stats = _timed(lambda: engine.calculate_concept_vector(text), repeat)
+    stats["tokens_per_s"] = n_tokens / stats["median_s"] if stats["median_s"] else None
+    results["uncached"] = stats
+
+    engine.embedder.cache = cache
+    if cache is not None:
+        engine.calculate_concept_vector(text)   # Fill
+        _, stats = _timed(lambda: engine.calculate_concept_vector(text), repeat)
+        stats["tokens_per_s"] = n_tokens / stats["median_s"] if stats["median_s"] else None
+        results["cached"] = stats
+    return results, vector
+
+def bench_lora(engine, vector, repeat: int) -> dict:
+    """
+    construct_analytic_lora_gguf: fresh synthesis (distinct vectors) and registry reuse.
+    """
+    import numpy as np
+    variants = []
+    for i in range(max(1, repeat)):
+        v = np.array(vector, dtype=np.float32)
+        v[0] += (i + 1) * 1e-6
+        variants.append(v)
+
+    paths, times = [], []
+    for v in variants:
+        start = time.perf_counter()
+        paths.append(engine.construct_analytic_lora_gguf(v))
+        times.append(time.perf_counter() - start)
+    synth = {"runs": len(times), "min_s": min(times), "median_s": statistics.median(times),
+             "mean_s": statistics.fmean(times), "adapter_bytes": os.path.getsize(paths[-1])}
+
+    _, reuse = _timed(lambda: engine.construct_analytic_lora_gguf(variants[-1]), repeat)
+    return {"synthesize": synth, "reuse": reuse,
+            "target_layers": list(engine.geometry.target_layers())}
+
+def bench_chat(manager, turns: int, max_tokens: int, repeat: int) -> dict:
+    """
+    Streamed chat latency per turn of a growing conversation: time to first
+    token, inter-token latency and decode rate.
+    """
+    from core.prompt_cache import Conversation
+    runs = []
+    for _ in range(max(1, repeat)):
+        with manager.lock:
+            manager.llm.reset()
+        conversation = Conversation("You are Genesis X, an advanced AI assistant.")
+        per_turn = []
+        for turn in range(turns):
+            user_msg = f"Summarize source {turn} of the lattice and relate it to the previous answers."
+            with manager.lock:
+                llm = manager.llm
+                prompt = conversation.build_prompt(llm, user_msg, manager.n_ctx, max_tokens)
+                start = time.perf_counter()
+                stamps, reply = [], ""
+                for chunk in llm(prompt, max_tokens=max_tokens, stop=["<|eot_id|>"], stream=True):
+                    stamps.append(time.perf_counter())
+                    reply += chunk["choices"][0]["text"]
+            conversation.add_exchange(user_msg, reply)
+            gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+            decode = stamps[-1] - stamps[0] if len(stamps) > 1 else 0.0
+            per_turn.append({
+                "prompt_tokens": len(prompt),
+                "tokens": len(stamps),
+                "ttft_s": stamps[0] - start if stamps else None,
+                "itl_p50_s": _percentile(gaps, 0.5),
+                "itl_p95_s": _percentile(gaps, 0.95),
+                "tokens_per_s": (len(stamps) - 1) / decode if decode else None,
+            })
+        runs.append(per_turn)
+
+    # Median over repeats, per turn
+    turns_out = []
+    for i in range(turns):
+        row = {}
+        for key in runs[0][i]:
+            values = [r[i][key] for r in runs if r[i][key] is not None]
+            row[key] = statistics.median(values) if values else None
+        turns_out.append(row)
+    return {"max_tokens": max_tokens, "runs": len(runs), "turns": turns_out}
+
+# --- Driver ---
+
+def run(args) -> dict:
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "mode": "model" if args.model else "stub",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "stages": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="genesis_bench_") as tmp:
+        samples = make_samples(tmp, args.corpus_kb)
+        if args.samples:
+            for name in sorted(os.listdir(args.samples)):
+                path = os.path.join(args.samples, name)
+                if os.path.isfile(path):
+                    samples[name] = path
+
+        if "parse" in stages:
+            try:
+                report["stages"]["parse"] = bench_parse(samples, args.repeat)
+            except ImportError as e:
+                report["stages"]["parse"] = {"skipped": str(e)}
+
+        needs_model = [s for s in ("concept", "lora", "chat") if s in stages]
+        if not needs_model:
+            return report
+        try:
+            model_path = args.model or write_stub_model(
+                os.path.join(tmp, "stub.gguf"), args.embd, args.layers, args.heads, args.heads_kv)
+            from core.singularity_engine import SingularityEngine
+            start = time.perf_counter()
+            manager = build_manager(args, model_path)
+            engine = SingularityEngine(model_path, os.path.join(tmp, "adapters"),
+                                       n_ctx=args.n_ctx, n_batch=args.n_batch,
+                                       chunk_tokens=args.chunk_tokens,
+                                       cache_dir=os.path.join(tmp, "embeddings"), manager=manager)
+            report["model_load_s"] = time.perf_counter() - start
+        except ImportError as e:
+            for stage in needs_model:
+                report["stages"][stage] = {"skipped": str(e)}
+            return report
+
+        with open(samples[".txt"], encoding="utf-8") as f:
+            text = f.read()
+        vector = None
+        if "concept" in stages or "lora" in stages:
+            concept, vector = bench_concept(engine, text, args.repeat)
+            if "concept" in stages:
+                report["stages"]["concept"] = concept
+        if "lora" in stages:
+            report["stages"]["lora"] = bench_lora(engine, vector, args.repeat)
+        if "chat" in stages:
+            report["stages"]["chat"] = bench_chat(engine.manager, args.turns, args.max_tokens, args.repeat)
+    return report
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the Genesis X pipeline and emit JSON.")
+    ap.add_argument("--model", help="Real GGUF model; omit to use the stub backend")
+    ap.add_argument("--out", help="Write the JSON report here instead of stdout")
+    ap.add_argument("--stages", default=",".join(STAGES), help="Comma-separated subset of: " + ", ".join(STAGES))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--corpus-kb", type=int, default=256, help="Size of each generated sample")
+    ap.add_argument("--samples", help="Directory of extra files to include in the parse stage")
+    ap.add_argument("--n-ctx", type=int, default=4096)
+    ap.add_argument("--n-batch", type=int, default=2048)
+    ap.add_argument("--chunk-tokens", type=int, default=512)
+    ap.add_argument("--turns", type=int, default=4, help="Chat turns per conversation")
+    ap.add_argument("--max-tokens", type=int, default=64, help="Tokens generated per chat turn")
+    # Stub backend geometry and simulated costs (seconds per token)
+    ap.add_argument("--embd", type=int, default=512)
+    ap.add_argument("--layers", type=int, default=16)
+    ap.add_argument("--heads", type=int, default=8)
+    ap.add_argument("--heads-kv", type=int, default=2)
+    ap.add_argument("--embed-cost", type=float, default=0.0)
+    ap.add_argument("--prompt-cost", type=float, default=0.0)
+    ap.add_argument("--token-cost", type=float, default=0.0)
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    report = run(args)
+    # Internal spans/counters recorded while the stages ran
+    from core.metrics import metrics
+    report["metrics"] = metrics.snapshot()
+    payload = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+if __name__ == "__main__":
+    main()
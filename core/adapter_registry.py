@@ -0,0 +1,75 @@
+import os
+import hashlib
+import logging
+from typing import Callable, Iterable, Optional
+import numpy as np
+from core.disk_index import DiskLRUIndex
+
+# Configure Logging
+logger = logging.getLogger("AdapterRegistry")
+
+class AdapterRegistry:
+    """
+    Content-addressed store of synthesized LoRA adapters.
+    Each adapter is keyed by everything that determines its bytes (concept
+    vector, rank, alpha, target layers, model fingerprint), so re-grafting an
+    unchanged corpus reuses the existing file. Old adapters are evicted LRU
+    once the count or disk quota is exceeded, except those pinned by a live session.
+    """
+    def __init__(self, adapter_dir: str, max_adapters: int = 16, max_bytes: int = 2 * 1024**3,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        self._pins = {}   # key -> sessions referencing the adapter
+        self.index = DiskLRUIndex(adapter_dir, ".gguf", max_bytes, max_entries=max_adapters,
+                                  on_evict=on_evict, pinned=lambda key: key in self._pins)
+
+    @staticmethod
+    def key(concept_vector: np.ndarray, rank: int, alpha: float,
+            target_layers: Iterable[int], model_fingerprint: str) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(np.ascontiguousarray(concept_vector, dtype=np.float32).tobytes())
+        h.update(f"|{rank}|{alpha}|{','.join(map(str, target_layers))}|{model_fingerprint}".encode("utf-8"))
+        return f"graft_{h.hexdigest()}"
+
+    def path(self, key: str) -> str:
+        return self.index.path(key)
+
+    @staticmethod
+    def _key_of(path: str) -> str:
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def pin(self, path: str):
+        """
+        Keeps an adapter on disk while something refers to it (reference counted).
+        """
+        key = self._key_of(path)
+        with self.index.lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, path: str):
+        key = self._key_of(path)
+        with self.index.lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """
+        Returns the adapter path if it was synthesized before and is still on disk.
+        """
+        if not self.index.touch(key):
+            return None
+        path = self.index.path(key)
+        if not os.path.exists(path):
+            self.index.drop(key)
+            return None
+        self.index.flush()
+        return path
+
+    def register(self, key: str):
+        """
+        Records a freshly written adapter at path(key) and applies the quota.
+        """
+        self.index.record(key, os.path.getsize(self.index.path(key)))
+        self.index.flush()
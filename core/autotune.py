@@ -0,0 +1,291 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import hashlib
+import logging
+import platform
+import argparse
+from typing import Dict, List, Optional, Sequence, Tuple
+from core.fingerprint import model_fingerprint
+from core.metrics import metrics
+
+# Configure Logging
+logger = logging.getLogger("Autotune")
+
+# Filler vocabulary for the synthetic calibration corpus
+_WORDS = ("the model reads every document and stores a vector for each chunk so that later "
+          "questions can be answered from the corpus with passages retrieved by similarity "
+          "while the adapter shifts the weights toward the concepts found in the data").split()
+
+def cpu_topology() -> Tuple[int, int]:
+    """
+    (physical cores, logical CPUs) usable by this process.
+    Physical cores come from /proc/cpuinfo where available, else equal the logical count.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        logical = len(os.sched_getaffinity(0))
+    else:
+        logical = os.cpu_count() or 1
+    cores = set()
+    try:
+        with open("/proc/cpuinfo") as f:
+            package = core = None
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    package = value.strip()
+                elif key == "core id":
+                    core = value.strip()
+                elif not key and core is not None:
+                    cores.add((package, core))
+                    package = core = None
+            if core is not None:
+                cores.add((package, core))
+    except OSError:
+        pass
+    physical = min(len(cores), logical) if cores else logical
+    return max(1, physical), max(1, logical)
+
+def host_id() -> str:
+    """
+    Identity of this machine's CPU setup (hostname, arch, CPU model, usable CPUs).
+    """
+    model = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    model = line.partition(":")[2].strip()
+                    break
+    except OSError:
+        pass
+    physical, logical = cpu_topology()
+    ident = f"{socket.gethostname()}|{platform.machine()}|{model}|{physical}|{logical}"
+    return hashlib.blake2b(ident.encode("utf-8"), digest_size=8).hexdigest()
+
+class TuningProfile:
+    """
+    Thread and batch settings for one (host, model) pair.
+    n_threads drives single-token decoding (chat), n_threads_batch prompt
+    and embedding batches; n_batch and chunk_tokens size the embedding waves.
+    """
+    FIELDS = ("n_threads", "n_threads_batch", "n_batch", "chunk_tokens")
+
+    def __init__(self, n_threads: int, n_threads_batch: int, n_batch: int = 2048,
+                 chunk_tokens: int = 512, calibrated: bool = False,
+                 measurements: Optional[Dict[str, list]] = None):
+        self.n_threads = n_threads
+        self.n_threads_batch = n_threads_batch
+        self.n_batch = n_batch
+        self.chunk_tokens = chunk_tokens
+        self.calibrated = calibrated
+        self.measurements = measurements or {}
+
+    def to_dict(self) -> dict:
+        data = {k: getattr(self, k) for k in self.FIELDS}
+        data["calibrated"] = self.calibrated
+        data["measurements"] = self.measurements
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TuningProfile":
+        return cls(*(int(data[k]) for k in cls.FIELDS), calibrated=bool(data.get("calibrated")),
+                   measurements=data.get("measurements"))
+
+    def __repr__(self):
+        values = ", ".join(f"{k}={getattr(self, k)}" for k in self.FIELDS)
+        return f"TuningProfile({values}{', calibrated' if self.calibrated else ''})"
+
+def default_profile() -> TuningProfile:
+    """
+    Uncalibrated settings from the CPU topology: decoding is memory-bound and
+    gains nothing from SMT siblings, batches can use every logical CPU.
+    """
+    physical, logical = cpu_topology()
+    return TuningProfile(n_threads=physical, n_threads_batch=logical)
+
+# (profile_dir, model_path) -> profile, so the manager and engine share one lookup
+_profiles: Dict[Tuple[Optional[str], str], TuningProfile] = {}
+
+def profile_path(profile_dir: str, model_path: str) -> str:
+    return os.path.join(profile_dir, f"{host_id()}-{model_fingerprint(model_path)}.json")
+
+def load_profile(profile_dir: Optional[str], model_path: Optional[str]) -> TuningProfile:
+    """
+    The saved profile for this host and model, or default_profile() if there is none.
+    """
+    key = (profile_dir, model_path)
+    profile = _profiles.get(key)
+    if profile is not None:
+        return profile
+    profile = None
+    if profile_dir and model_path and os.path.exists(model_path):
+        path = profile_path(profile_dir, model_path)
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    profile = TuningProfile.from_dict(json.load(f))
+                logger.info(f"Tuning profile loaded: {profile}")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Ignoring unreadable tuning profile {path}: {e}")
+        else:
+            logger.info(f"No tuning profile for this host/model; run `python -m core.autotune {model_path}`")
+    if profile is None:
+        profile = default_profile()
+    _profiles[key] = profile
+    return profile
+
+def save_profile(profile_dir: str, model_path: str, profile: TuningProfile) -> str:
+    os.makedirs(profile_dir, exist_ok=True)
+    path = profile_path(profile_dir, model_path)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(profile.to_dict(), f, indent=2)
+    os.replace(tmp, path)
+    _profiles[(profile_dir, model_path)] = profile
+    return path
+
+def _pick(rates: Sequence[Tuple[object, float]], tolerance: float):
+    """
+    First candidate (in preference order) within tolerance of the fastest.
+    """
+    best = max(rate for _, rate in rates)
+    for candidate, rate in rates:
+        if rate >= best * (1.0 - tolerance):
+            return candidate
+
+def _synthetic_tokens(manager, n_tokens: int, seed: int = 0) -> List[int]:
+    rng = random.Random(seed)
+    tokens: List[int] = []
+    while len(tokens) < n_tokens:
+        text = " ".join(rng.choice(_WORDS) for _ in range(512))
+        tokens.extend(manager.tokenize(text.encode("utf-8"), add_bos=False))
+    return tokens[:n_tokens]
+
+def _decode_rate(manager, prompt: List[int], n_tokens: int) -> float:
+    """
+    Single-token decode steps per second after a short prompt.
+    """
+    llm = manager.llm
+    llm.reset()
+    llm.eval(prompt)
+    start = time.perf_counter()
+    for i in range(n_tokens):
+        llm.eval([prompt[i % len(prompt)]])
+    rate = n_tokens / (time.perf_counter() - start)
+    llm.reset()
+    return rate
+
+def _embed_rate(manager, tokens: List[int], n_batch: int, chunk_tokens: int) -> float:
+    """
+    Corpus tokens embedded per second, through the same wave packing as a graft.
+    """
+    from core.batch_embedder import BatchEmbedder
+    chunks = [tokens[i:i + chunk_tokens] for i in range(0, len(tokens), chunk_tokens)]
+    embedder = BatchEmbedder(manager, n_batch=n_batch)
+    # Warm-up wave, so allocation and first-touch paging are not timed
+    for _ in embedder.embed_chunks(chunks[:1]):
+        pass
+    start = time.perf_counter()
+    for _ in embedder.embed_chunks(chunks):
+        pass
+    return len(tokens) / (time.perf_counter() - start)
+
+def calibrate(model_path: str, profile_dir: Optional[str] = None,
+              thread_candidates: Optional[Sequence[int]] = None,
+              batch_candidates: Sequence[int] = (2048, 1024, 512),
+              chunk_candidates: Sequence[int] = (512, 256),
+              gen_tokens: int = 32, embed_tokens: int = 4096,
+              tolerance: float = 0.05) -> TuningProfile:
+    """
+    Measures this host and returns (and, with profile_dir, saves) the best profile.
+    1. n_threads: decode rate per thread count.
+    2. n_threads_batch: embedding rate per thread count.
+    3. n_batch x chunk_tokens: embedding rate per combination (one model load per n_batch),
+       with chunk_tokens < n_batch so a chunk plus its BOS token fits one sequence.
+    Candidates are listed in order of preference; a later one is only chosen
+    when it beats every earlier one by more than `tolerance`.
+    """
+    from core.model_manager import ModelManager
+    if not any(chunk < n_batch for chunk in chunk_candidates for n_batch in batch_candidates):
+        raise ValueError(f"No chunk size in {list(chunk_candidates)} is smaller than a batch size in "
+                         f"{list(batch_candidates)}")
+    physical, logical = cpu_topology()
+    if thread_candidates is None:
+        thread_candidates = sorted({physical, logical, max(1, physical // 2)})
+    measurements: Dict[str, list] = {"n_threads": [], "n_threads_batch": [], "n_batch": []}
+    logger.info(f"Calibrating {os.path.basename(model_path)} on {physical} cores / {logical} CPUs")
+
+    with metrics.span("calibrate"):
+        base_batch = max(batch_candidates)
+        manager = ModelManager(model_path, n_ctx=max(4096, base_batch), n_batch=base_batch,
+                               n_threads=physical, n_threads_batch=logical, prompt_cache_bytes=0)
+        tokens = _synthetic_tokens(manager, embed_tokens)
+        prompt = tokens[:64]
+
+        for n in thread_candidates:
+            manager.set_threads(n, logical)
+            rate = _decode_rate(manager, prompt, gen_tokens)
+            measurements["n_threads"].append([n, rate])
+            logger.info(f"n_threads={n}: {rate:.1f} tok/s decode")
+        n_threads = _pick(measurements["n_threads"], tolerance)
+
+        for n in thread_candidates:
+            manager.set_threads(n_threads, n)
+            rate = _embed_rate(manager, tokens, base_batch, max(c for c in chunk_candidates if c < base_batch))
+            measurements["n_threads_batch"].append([n, rate])
+            logger.info(f"n_threads_batch={n}: {rate:.1f} tok/s embed")
+        n_threads_batch = _pick(measurements["n_threads_batch"], tolerance)
+        del manager
+
+        combos = []
+        for n_batch in batch_candidates:
+            if not any(chunk < n_batch for chunk in chunk_candidates):
+                continue
+            manager = ModelManager(model_path, n_ctx=max(4096, n_batch), n_batch=n_batch,
+                                   n_threads=n_threads, n_threads_batch=n_threads_batch,
+                                   prompt_cache_bytes=0)
+            for chunk in chunk_candidates:
+                if chunk >= n_batch:
+                    continue
+                rate = _embed_rate(manager, tokens, n_batch, chunk)
+                measurements["n_batch"].append([n_batch, chunk, rate])
+                combos.append(((n_batch, chunk), rate))
+                logger.info(f"n_batch={n_batch} chunk_tokens={chunk}: {rate:.1f} tok/s embed")
+            del manager
+        n_batch, chunk_tokens = _pick(combos, tolerance)
+
+    profile = TuningProfile(n_threads, n_threads_batch, n_batch, chunk_tokens,
+                            calibrated=True, measurements=measurements)
+    if profile_dir:
+        path = save_profile(profile_dir, model_path, profile)
+        logger.info(f"Tuning profile saved: {path}")
+    return profile
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Measure thread/batch settings for a model on this host.")
+    ap.add_argument("model", help="GGUF model to calibrate")
+    ap.add_argument("--profile-dir", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                          "cache", "tuning"))
+    ap.add_argument("--threads", type=int, nargs="+", help="Thread counts to try (default: from CPU topology)")
+    ap.add_argument("--batches", type=int, nargs="+", default=[2048, 1024, 512])
+    ap.add_argument("--chunks", type=int, nargs="+", default=[512, 256])
+    ap.add_argument("--embed-tokens", type=int, default=4096, help="Synthetic corpus size per measurement")
+    args = ap.parse_args(argv)
+
+    if not any(c < b for c in args.chunks for b in args.batches):
+        ap.error("at least one --chunks value must be smaller than a --batches value")
+
+    logging.basicConfig(level=logging.INFO)
+    profile = calibrate(args.model, args.profile_dir, thread_candidates=args.threads,
+                        batch_candidates=args.batches, chunk_candidates=args.chunks,
+                        embed_tokens=args.embed_tokens)
+    print(json.dumps(profile.to_dict(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
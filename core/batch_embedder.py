@@ -0,0 +1,74 @@
+import logging
+from typing import Iterable, Iterator, List
+import numpy as np
+from core.fingerprint import token_hash
+from core.metrics import metrics
+
+# Configure Logging
+logger = logging.getLogger("BatchEmbedder")
+
+class BatchEmbedder:
+    """
+    Packs many token chunks into each llama.cpp decode call.
+    Llama.embed() places every input in its own sequence of a shared batch,
+    so we feed it 'waves' of chunks sized to fill n_batch tokens and stream
+    the pooled vectors back as each wave completes.
+    Chunks found in the optional EmbeddingCache skip the model entirely.
+    """
+    def __init__(self, llm, n_batch: int = 2048, cache=None, max_window: int = 256):
+        self.llm = llm
+        self.n_batch = n_batch
+        self.cache = cache
+        # Upper bound on results held back to keep output in input order
+        self.max_window = max_window
+
+    def _embed_wave(self, wave: List[List[int]]) -> List[np.ndarray]:
+        texts = [self.llm.detokenize(chunk).decode("utf-8", errors="ignore") for chunk in wave]
+        with metrics.span("embed"):
+            vectors = self.llm.embed(texts, truncate=True)
+        metrics.inc("chunks_embedded", len(wave))
+        return [np.asarray(vec, dtype=np.float32) for vec in vectors]
+
+    def _flush(self, slots, misses):
+        if misses:
+            vectors = self._embed_wave([chunk for _, chunk, _ in misses])
+            for (slot, _, key), vec in zip(misses, vectors):
+                slots[slot] = vec
+                if self.cache is not None:
+                    self.cache.put(key, vec)
+        return slots
+
+    def embed_chunks(self, chunks: Iterable[List[int]]) -> Iterator[np.ndarray]:
+        """
+        Yields one pooled embedding per non-empty chunk, in input order.
+        """
+        slots, misses, miss_tokens = [], [], 0
+        for chunk in chunks:
+            if not chunk:
+                continue
+            key = None
+            if self.cache is not None:
+                key = token_hash(chunk)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    slots.append(cached)
+                    if len(slots) >= self.max_window:
+                        yield from self._flush(slots, misses)
+                        slots, misses, miss_tokens = [], [], 0
+                    continue
+
+            # +1 for the BOS token added when the chunk is re-tokenized
+            cost = min(len(chunk) + 1, self.n_batch)
+            if misses and miss_tokens + cost > self.n_batch:
+                yield from self._flush(slots, misses)
+                slots, misses, miss_tokens = [], [], 0
+            slots.append(None)
+            misses.append((len(slots) - 1, chunk, key))
+            miss_tokens += cost
+            if len(slots) >= self.max_window:
+                yield from self._flush(slots, misses)
+                slots, misses, miss_tokens = [], [], 0
+
+        yield from self._flush(slots, misses)
+        if self.cache is not None:
+            self.cache.flush()
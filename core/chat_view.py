@@ -0,0 +1,59 @@
+import logging
+from typing import List, Optional, Tuple
+from nicegui import ui
+
+# Configure Logging
+logger = logging.getLogger("ChatView")
+
+class ChatView:
+    """
+    Incremental chat renderer.
+    Messages are appended to the container once and never rebuilt; the
+    streaming message's text is updated in place, and token updates are
+    coalesced so at most `fps` DOM/websocket updates go out per second.
+    """
+    def __init__(self, container, fps: float = 20):
+        self.container = container
+        self._labels: List[ui.label] = []
+        self._pending: Optional[str] = None
+        with self.container:
+            self._timer = ui.timer(1.0 / fps, self.flush)
+
+    def __len__(self):
+        return len(self._labels)
+
+    def append(self, role: str, text: str = ""):
+        """
+        Adds one message bubble; later updates target the newest one.
+        """
+        self.flush()
+        with self.container:
+            if role == "User":
+                with ui.row().classes('w-full justify-end'):
+                    with ui.chat_message(name="You", sent=True, avatar="https://robohash.org/user?set=set4").props('bg-color=primary text-color=black'):
+                        label = ui.label(text).classes('whitespace-pre-wrap')
+            else:
+                with ui.row().classes('w-full justify-start'):
+                    with ui.chat_message(name="Genesis", sent=False, avatar="https://robohash.org/genesis?set=set1").props('bg-color=grey-9 text-color=white'):
+                        label = ui.label(text).classes('whitespace-pre-wrap')
+        self._labels.append(label)
+        return label
+
+    def sync(self, history: List[Tuple[str, str]]):
+        """
+        Appends any history entries not yet on screen.
+        """
+        for role, text in history[len(self._labels):]:
+            self.append(role, text)
+
+    def update(self, text: str):
+        """
+        Sets the newest message's text; pushed to the browser on the next frame.
+        """
+        self._pending = text
+
+    def flush(self):
+        if self._pending is None or not self._labels:
+            return
+        self._labels[-1].set_text(self._pending)
+        self._pending = None
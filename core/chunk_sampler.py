@@ -0,0 +1,154 @@
+import heapq
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from core.metrics import metrics
+
+# Configure Logging
+logger = logging.getLogger("ChunkSampler")
+
+class SamplePlan:
+    """
+    What to embed for one graft and how to weight it.
+    `embed[source]` maps chunk index -> cluster id for the representative
+    chunks to run through the model (read back from that source).
+    `weights[source]` maps cluster id -> weight; each source's weights sum
+    to its original chunk count, so weighted sums pool like full embedding.
+    """
+    def __init__(self):
+        self.embed: Dict[str, Dict[int, int]] = {}
+        self.weights: Dict[str, Dict[int, float]] = {}
+        self.chunks: Dict[str, int] = {}
+        self.tokens: Dict[str, int] = {}
+        self.clusters = 0
+
+    @property
+    def selected(self) -> int:
+        return sum(len(picks) for picks in self.embed.values())
+
+class ChunkSampler:
+    """
+    Pre-embedding stage for a graft.
+    Token chunks are MinHashed over k-token shingles and bucketed with LSH
+    bands; chunks whose estimated Jaccard similarity to an earlier chunk
+    reaches `threshold` join its cluster instead of being embedded again
+    (repeated log lines, headers, license text). Within an optional
+    embedding budget, each source then gets a share of the distinct
+    clusters proportional to its size (at least one), picked evenly across
+    the source, and the picks are weighted by the chunks they stand for.
+    """
+    def __init__(self, budget: Optional[int] = None, num_perm: int = 64, bands: int = 16,
+                 shingle: int = 4, threshold: float = 0.8, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.budget = budget
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self.threshold = threshold
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hash family; uint64 wrap-around is intended
+        self._a = rng.integers(0, 2**64 - 1, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**64 - 1, size=num_perm, dtype=np.uint64)
+
+    def signature(self, tokens: List[int]) -> np.ndarray:
+        """
+        MinHash signature (num_perm x uint32) of the chunk's set of k-token shingles.
+        """
+        t = np.asarray(tokens, dtype=np.uint64)
+        k = min(self.shingle, len(t))
+        n = len(t) - k + 1
+        h = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            h = h * np.uint64(1000003) + t[j:j + n]
+        h = np.unique(h)
+        hv = (self._a[:, None] * h[None, :] + self._b[:, None]) >> np.uint64(32)
+        return hv.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray):
+        for band in range(self.bands):
+            yield band, sig[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    @staticmethod
+    def _allocate(sizes: Dict[str, int], capacity: Dict[str, int], budget: int) -> Dict[str, int]:
+        """
+        Splits budget across sources in proportion to sizes (D'Hondt), at least
+        one each and never more than a source's distinct clusters.
+        """
+        quotas = {s: 1 for s in sizes}
+        heap = [(-sizes[s] / 2, s) for s in sizes if capacity[s] > 1]
+        heapq.heapify(heap)
+        remaining = budget - len(quotas)
+        while remaining > 0 and heap:
+            _, s = heapq.heappop(heap)
+            quotas[s] += 1
+            remaining -= 1
+            if quotas[s] < capacity[s]:
+                heapq.heappush(heap, (-sizes[s] / (quotas[s] + 1), s))
+        return quotas
+
+    def plan(self, sources: Dict[str, Callable[[], Iterable[List[int]]]]) -> SamplePlan:
+        """
+        Reads every source's token chunks once and returns the SamplePlan.
+        `sources` maps a name to a callable returning a fresh chunk iterator.
+        """
+        plan = SamplePlan()
+        buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        signatures: List[np.ndarray] = []
+        reps: List[Tuple[str, int]] = []          # cluster id -> (source, chunk index)
+        members: Dict[str, Dict[int, int]] = {}   # source -> {cluster: chunks}, first-seen order
+
+        for name, read in sources.items():
+            counts = members.setdefault(name, {})
+            n, n_tokens = 0, 0
+            for idx, chunk in enumerate(read()):
+                n += 1
+                n_tokens += len(chunk)
+                sig = self.signature(chunk)
+                cluster = None
+                for key in self._band_keys(sig):
+                    for candidate in buckets.get(key, ()):
+                        if np.mean(signatures[candidate] == sig) >= self.threshold:
+                            cluster = candidate
+                            break
+                    if cluster is not None:
+                        break
+                if cluster is None:
+                    cluster = len(reps)
+                    reps.append((name, idx))
+                    signatures.append(sig)
+                    for key in self._band_keys(sig):
+                        buckets.setdefault(key, []).append(cluster)
+                counts[cluster] = counts.get(cluster, 0) + 1
+            plan.chunks[name] = n
+            plan.tokens[name] = n_tokens
+        plan.clusters = len(reps)
+
+        active = {s: c for s, c in members.items() if c}
+        sizes = {s: plan.chunks[s] for s in active}
+        capacity = {s: len(c) for s, c in active.items()}
+        if self.budget is None or self.budget >= sum(capacity.values()):
+            quotas = capacity
+        else:
+            if self.budget < len(active):
+                logger.warning(f"Embedding budget {self.budget} < {len(active)} sources; embedding one chunk per source")
+            quotas = self._allocate(sizes, capacity, self.budget)
+
+        for name, counts in active.items():
+            clusters = list(counts)
+            q = quotas[name]
+            # Evenly spaced over the source, so every part of it is represented
+            picks = [clusters[int((i + 0.5) * len(clusters) / q)] for i in range(q)]
+            mass = sum(counts[c] for c in picks)
+            plan.weights[name] = {c: counts[c] * plan.chunks[name] / mass for c in picks}
+            for c in picks:
+                src, idx = reps[c]
+                plan.embed.setdefault(src, {})[idx] = c
+
+        total = sum(plan.chunks.values())
+        metrics.inc("chunks_deduplicated", total - plan.clusters)
+        metrics.inc("chunks_sampled_out", plan.clusters - plan.selected)
+        logger.info(f"Sampling: {total} chunks -> {plan.clusters} distinct -> {plan.selected} to embed "
+                    f"across {len(active)} sources")
+        return plan
@@ -0,0 +1,79 @@
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+
+# Configure Logging
+logger = logging.getLogger("ConceptAccumulator")
+
+class ConceptAccumulator:
+    """
+    Incremental Spectral Lattice state.
+    Keeps a running sum of chunk embeddings plus each source's contribution,
+    so sources can be added or dropped and the concept vector re-normalized
+    in O(dim) without re-embedding the rest of the corpus.
+    """
+    def __init__(self):
+        self.pending: Dict[str, Optional[str]] = {}  # name -> text (None: read from corpus), not yet embedded
+        self.sources: Dict[str, dict] = {}  # name -> {"sum", "chunks", "tokens"}
+        self._sum: Optional[np.ndarray] = None
+        self.chunk_count = 0
+        self.token_count = 0
+
+    def stage(self, name: str, text: Optional[str] = None):
+        """
+        Queues a parsed source for embedding on the next graft.
+        Without text, the engine streams the source from the corpus store.
+        Re-staging a name replaces its previous contribution.
+        """
+        self.remove_source(name)
+        self.pending[name] = text
+
+    def add_source(self, name: str, vec_sum: np.ndarray, chunks: int, tokens: int):
+        self.remove_source(name)
+        if chunks <= 0:
+            return
+        vec_sum = np.asarray(vec_sum, dtype=np.float64)
+        self.sources[name] = {"sum": vec_sum, "chunks": chunks, "tokens": tokens}
+        if self._sum is None:
+            self._sum = vec_sum.copy()
+        else:
+            self._sum += vec_sum
+        self.chunk_count += chunks
+        self.token_count += tokens
+
+    def remove_source(self, name: str) -> bool:
+        removed = name in self.pending
+        self.pending.pop(name, None)
+        entry = self.sources.pop(name, None)
+        if entry is not None:
+            self.chunk_count -= entry["chunks"]
+            self.token_count -= entry["tokens"]
+            if self.chunk_count <= 0:
+                self._sum, self.chunk_count, self.token_count = None, 0, 0
+            else:
+                self._sum -= entry["sum"]
+            removed = True
+        return removed
+
+    def names(self) -> List[str]:
+        return list(self.sources) + [n for n in self.pending if n not in self.sources]
+
+    def contributions(self) -> Dict[str, float]:
+        """
+        Fraction of the pooled mean contributed by each embedded source.
+        """
+        if not self.chunk_count:
+            return {}
+        return {name: e["chunks"] / self.chunk_count for name, e in self.sources.items()}
+
+    def vector(self) -> Optional[np.ndarray]:
+        """
+        Mean-pooled, unit-length concept vector over all embedded sources.
+        """
+        if self._sum is None or not self.chunk_count:
+            return None
+        concept_vector = self._sum / self.chunk_count
+        norm = np.linalg.norm(concept_vector)
+        if norm > 0:
+            concept_vector = concept_vector / norm
+        return concept_vector
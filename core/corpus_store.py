@@ -0,0 +1,255 @@
+import os
+import mmap
+import bisect
+import shutil
+import logging
+import tempfile
+from typing import Iterable, Iterator, List, Optional
+
+# Configure Logging
+logger = logging.getLogger("CorpusStore")
+
+class CorpusSegment:
+    """
+    One ingested source. Text lives in RAM until spilled, then in a UTF-8
+    file that is read back through mmap.
+    """
+    def __init__(self, name: str, text: str, meta: Optional[dict] = None):
+        self.name = name
+        self.meta = meta or {}
+        self.chars = len(text)
+        self.text: Optional[str] = text
+        self.nbytes = len(text.encode("utf-8"))
+        self.path: Optional[str] = None
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        # Spilled segments: (char offset, byte offset) at block boundaries, built on first read()
+        self._marks: Optional[List[int]] = None
+        self._byte_marks: Optional[List[int]] = None
+
+    @classmethod
+    def from_spill(cls, name: str, path: str, chars: int, nbytes: int, meta: Optional[dict] = None):
+        """
+        Wraps a spill file that was written directly (streamed ingestion).
+        """
+        seg = cls(name, "", meta)
+        seg.chars, seg.nbytes, seg.path = chars, nbytes, path
+        seg.text = None
+        seg._open_map()
+        return seg
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    def _open_map(self):
+        self._file = open(self.path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def spill(self, spill_dir: str):
+        if self.spilled or not self.nbytes:
+            return
+        fd, self.path = tempfile.mkstemp(suffix=".seg", dir=spill_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.text.encode("utf-8"))
+        self._open_map()
+        self.text = None
+
+    def iter_blocks(self, block_chars: int) -> Iterator[str]:
+        """
+        Streams the segment in blocks of roughly block_chars, split on line
+        boundaries where possible.
+        """
+        if not self.spilled:
+            text, pos = self.text, 0
+            while pos < len(text):
+                end = min(pos + block_chars, len(text))
+                if end < len(text):
+                    cut = text.rfind("\n", pos, end)
+                    if cut > pos:
+                        end = cut + 1
+                yield text[pos:end]
+                pos = end
+            return
+
+        # Newline bytes never occur inside a multi-byte UTF-8 sequence, so
+        # cutting on b"\n" keeps characters intact.
+        data, pos, size = self._map, 0, self.nbytes
+        while pos < size:
+            end = min(pos + block_chars, size)
+            if end < size:
+                cut = data.rfind(b"\n", pos, end)
+                if cut > pos:
+                    end = cut + 1
+                else:
+                    # No newline: back off to a UTF-8 lead byte
+                    back = end
+                    while back > pos and (data[back] & 0xC0) == 0x80:
+                        back -= 1
+                    if back > pos:
+                        end = back
+            yield data[pos:end].decode("utf-8", errors="ignore")
+            pos = end
+
+    def read(self, start: int, end: int) -> str:
+        """
+        Text between character offsets [start, end).
+        """
+        if not self.spilled:
+            return self.text[start:end]
+        if self._marks is None:
+            marks, byte_marks, chars, nbytes = [0], [0], 0, 0
+            for block in self.iter_blocks(1 << 16):
+                chars += len(block)
+                nbytes += len(block.encode("utf-8"))
+                marks.append(chars)
+                byte_marks.append(nbytes)
+            self._marks, self._byte_marks = marks, byte_marks
+        i = max(0, bisect.bisect_right(self._marks, start) - 1)
+        char_pos, byte_pos = self._marks[i], self._byte_marks[i]
+        # At most 4 bytes per character
+        raw = self._map[byte_pos:min(self.nbytes, byte_pos + (end - char_pos) * 4)]
+        return raw.decode("utf-8", errors="ignore")[start - char_pos:end - char_pos]
+
+    def tail(self, n_chars: int) -> str:
+        if not self.spilled:
+            return self.text[-n_chars:]
+        start = max(0, self.nbytes - n_chars * 4)
+        return self._map[start:].decode("utf-8", errors="ignore")[-n_chars:]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class CorpusStore:
+    """
+    Segmented ingestion buffer.
+    Keeps one segment per source with metadata; once the in-RAM total passes
+    ram_threshold, the oldest segments are spilled to memory-mapped files.
+    """
+    def __init__(self, spill_root: str, ram_threshold: int = 256 * 1024**2):
+        os.makedirs(spill_root, exist_ok=True)
+        self.spill_dir = tempfile.mkdtemp(prefix="corpus_", dir=spill_root)
+        self.ram_threshold = ram_threshold
+        self.segments: List[CorpusSegment] = []
+
+    def __len__(self):
+        return len(self.segments)
+
+    @property
+    def total_chars(self) -> int:
+        return sum(seg.chars for seg in self.segments)
+
+    @property
+    def ram_bytes(self) -> int:
+        return sum(seg.nbytes for seg in self.segments if not seg.spilled)
+
+    def names(self) -> List[str]:
+        return [seg.name for seg in self.segments]
+
+    def get(self, name: str) -> Optional[CorpusSegment]:
+        for seg in self.segments:
+            if seg.name == name:
+                return seg
+        return None
+
+    def add_source(self, name: str, text: str, **meta) -> CorpusSegment:
+        """
+        Appends a source, replacing any earlier segment with the same name.
+        """
+        self.remove_source(name)
+        seg = CorpusSegment(name, text, meta)
+        self.segments.append(seg)
+        self._spill_over_threshold()
+        return seg
+
+    def add_stream(self, name: str, blocks: Iterable[str], **meta) -> CorpusSegment:
+        """
+        Builds a segment from streamed text blocks. Once a source passes
+        ram_threshold its blocks go straight to a spill file, so a multi-GB
+        source is never held in RAM at once.
+        """
+        parts, chars, nbytes = [], 0, 0
+        f, path = None, None
+        try:
+            for block in blocks:
+                data = block.encode("utf-8")
+                chars += len(block)
+                nbytes += len(data)
+                if f is not None:
+                    f.write(data)
+                    continue
+                parts.append(block)
+                if nbytes > self.ram_threshold:
+                    fd, path = tempfile.mkstemp(suffix=".seg", dir=self.spill_dir)
+                    f = os.fdopen(fd, 'wb')
+                    for part in parts:
+                        f.write(part.encode("utf-8"))
+                    parts = []
+        except BaseException:
+            if f is not None:
+                f.close()
+                os.remove(path)
+            raise
+
+        if f is None:
+            seg = CorpusSegment(name, "".join(parts), meta)
+        else:
+            f.close()
+            seg = CorpusSegment.from_spill(name, path, chars, nbytes, meta)
+            logger.info(f"Streamed {name} ({nbytes / 1024**2:.1f} MB) to disk")
+
+        self.remove_source(name)
+        self.segments.append(seg)
+        self._spill_over_threshold()
+        return seg
+
+    def remove_source(self, name: str) -> bool:
+        seg = self.get(name)
+        if seg is None:
+            return False
+        self.segments.remove(seg)
+        seg.close()
+        return True
+
+    def _spill_over_threshold(self):
+        ram = self.ram_bytes
+        for seg in self.segments:
+            if ram <= self.ram_threshold:
+                break
+            if not seg.spilled:
+                ram -= seg.nbytes
+                seg.spill(self.spill_dir)
+                logger.info(f"Spilled {seg.name} ({seg.nbytes / 1024**2:.1f} MB) to disk")
+
+    def iter_source(self, name: str, block_chars: int = 1 << 20) -> Iterator[str]:
+        seg = self.get(name)
+        if seg is not None:
+            yield from seg.iter_blocks(block_chars)
+
+    def iter_text(self, block_chars: int = 1 << 20) -> Iterator[str]:
+        """
+        Streams the whole corpus in source order without materializing it.
+        """
+        for seg in self.segments:
+            yield f"\n\n--- SOURCE: {seg.name} ---\n"
+            yield from seg.iter_blocks(block_chars)
+
+    def tail(self, n_chars: int = 2000) -> str:
+        """
+        Preview tail, served from the last segment only.
+        """
+        if not self.segments:
+            return ""
+        seg = self.segments[-1]
+        return f"--- SOURCE: {seg.name} ---\n{seg.tail(n_chars)}"
+
+    def close(self):
+        for seg in self.segments:
+            seg.close()
+        self.segments = []
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
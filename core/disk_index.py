@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Callable, Optional
+
+# Configure Logging
+logger = logging.getLogger("DiskIndex")
+
+class DiskLRUIndex:
+    """
+    Size-bounded LRU bookkeeping for a directory of cache entry files.
+    Tracks [size_bytes, last_access] per key in index.json; evicting a key
+    removes its file. Shared by the on-disk caches. Keys for which `pinned`
+    returns True are skipped by eviction.
+    """
+    def __init__(self, root: str, suffix: str, max_bytes: int,
+                 max_entries: Optional[int] = None, on_evict: Optional[Callable[[str], None]] = None,
+                 pinned: Optional[Callable[[str], bool]] = None):
+        self.root = root
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self.pinned = pinned
+        os.makedirs(self.root, exist_ok=True)
+
+        self.lock = threading.RLock()
+        self._index_path = os.path.join(self.root, "index.json")
+        self._dirty = False
+
+        # key -> [size_bytes, last_access]
+        self.entries = {}
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, 'r') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logger.warning(f"Cache index {self._index_path} unreadable, starting fresh: {e}")
+        self.total = sum(size for size, _ in self.entries.values())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}{self.suffix}")
+
+    def touch(self, key: str) -> bool:
+        """
+        Marks a key as used. Returns False if it is not indexed.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False
+            entry[1] = time.time()
+            self._dirty = True
+            return True
+
+    def write(self, key: str, data: bytes):
+        """
+        Atomically writes an entry file and records it, evicting as needed.
+        """
+        path = self.path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.record(key, len(data))
+
+    def record(self, key: str, size: int):
+        """
+        Records an entry file that was written in place at path(key).
+        """
+        with self.lock:
+            if key in self.entries:
+                self.total -= self.entries[key][0]
+            self.entries[key] = [size, time.time()]
+            self.total += size
+            self._dirty = True
+            # The entry just written is never its own eviction victim
+            self._evict(keep=key)
+
+    def drop(self, key: str):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return
+            self.total -= entry[0]
+            self._dirty = True
+        if self.on_evict is not None:
+            self.on_evict(self.path(key))
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def _over_quota(self) -> bool:
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            return True
+        return self.total > self.max_bytes
+
+    def _evict(self, keep: Optional[str] = None):
+        if not self._over_quota():
+            return
+        # Oldest access first
+        for key in sorted(self.entries, key=lambda k: self.entries[k][1]):
+            if not self._over_quota():
+                break
+            if key == keep or (self.pinned is not None and self.pinned(key)):
+                continue
+            self.drop(key)
+
+    def flush(self) -> bool:
+        """
+        Persists the index so the cache survives a restart.
+        """
+        with self.lock:
+            if not self._dirty:
+                return False
+            tmp_path = f"{self._index_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self._index_path)
+            self._dirty = False
+            return True
@@ -0,0 +1,57 @@
+import io
+import os
+import logging
+import threading
+from typing import Optional
+import numpy as np
+from core.disk_index import DiskLRUIndex
+from core.metrics import metrics
+
+# Configure Logging
+logger = logging.getLogger("EmbeddingCache")
+
+class EmbeddingCache:
+    """
+    On-disk chunk embedding cache keyed by (model fingerprint, chunk token hash).
+    Each entry is a small .npy file read into memory on lookup (a graft can
+    hold hundreds of thousands of hits, far more than the process may map);
+    an index file tracks sizes and access times for size-bounded LRU eviction.
+    """
+    def __init__(self, cache_dir: str, model_fingerprint: str, max_bytes: int = 2 * 1024**3):
+        self.root = os.path.join(cache_dir, model_fingerprint)
+        self.index = DiskLRUIndex(self.root, ".npy", max_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        vec = None
+        if self.index.touch(key):
+            try:
+                vec = np.load(self.index.path(key))
+            except (FileNotFoundError, ValueError, EOFError):
+                # File vanished or is truncated: treat as a miss and forget it
+                self.index.drop(key)
+            except OSError as e:
+                # Transient (e.g. out of file handles): a miss, but the entry is kept
+                logger.warning(f"Embedding cache read failed for {key}: {e}")
+        with self._lock:
+            if vec is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.inc("embedding_cache_misses" if vec is None else "embedding_cache_hits")
+        return vec
+
+    def put(self, key: str, vector: np.ndarray):
+        buf = io.BytesIO()
+        np.save(buf, np.asarray(vector, dtype=np.float32))
+        self.index.write(key, buf.getvalue())
+
+    def flush(self):
+        """
+        Persists the index so the cache survives a restart.
+        """
+        if self.index.flush():
+            logger.info(f"Embedding cache: {len(self.index)} entries, {self.index.total / 1024**2:.1f} MB "
+                        f"({self.hits} hits / {self.misses} misses)")
@@ -0,0 +1,27 @@
+import os
+import hashlib
+from array import array
+from typing import Sequence
+
+# Bytes sampled from each end of the model file. Hashing the full 4-8GB GGUF
+# would cost more than the embeddings it protects.
+_SAMPLE_BYTES = 1 << 20
+
+def model_fingerprint(model_path: str) -> str:
+    """
+    Cheap, stable identity for a model file (size + head/tail sample).
+    """
+    size = os.path.getsize(model_path)
+    h = hashlib.sha256(str(size).encode("ascii"))
+    with open(model_path, 'rb') as f:
+        h.update(f.read(_SAMPLE_BYTES))
+        if size > _SAMPLE_BYTES:
+            f.seek(max(size - _SAMPLE_BYTES, _SAMPLE_BYTES))
+            h.update(f.read(_SAMPLE_BYTES))
+    return h.hexdigest()[:32]
+
+def token_hash(tokens: Sequence[int]) -> str:
+    """
+    Content address for a token chunk.
+    """
+    return hashlib.blake2b(array('q', tokens).tobytes(), digest_size=16).hexdigest()
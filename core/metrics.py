@@ -0,0 +1,154 @@
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, TypeVar
+
+# Configure Logging
+logger = logging.getLogger("Metrics")
+
+T = TypeVar("T")
+
+# Known series; anything else is still recorded, just without HELP text
+STAGES = {
+    "parse": "File parsing (full and streamed)",
+    "tokenize": "Corpus tokenization",
+    "embed": "Chunk embedding waves",
+    "adapter_write": "LoRA adapter synthesis and GGUF write",
+    "model_load": "llama.cpp model load",
+    "calibrate": "Hardware autotuning run",
+    "graft": "End-to-end graft (embed + adapter)",
+    "retrieve": "Passage retrieval for a chat turn",
+    "queue_wait": "Wait for a generation context",
+    "ttft": "Time to first token",
+    "generate": "Token generation after the first token",
+}
+COUNTERS = {
+    "bytes_ingested": "Bytes of parsed text added to corpora",
+    "sources_ingested": "Sources added to corpora",
+    "tokens_embedded": "Corpus tokens tokenized for embedding",
+    "chunks_embedded": "Chunks run through the model",
+    "chunks_deduplicated": "Chunks folded into a near-duplicate cluster",
+    "chunks_sampled_out": "Distinct chunks left out by the embedding budget",
+    "embedding_cache_hits": "Chunk embeddings served from cache",
+    "embedding_cache_misses": "Chunk embeddings not in cache",
+    "parse_cache_hits": "Parses served from cache",
+    "parse_cache_misses": "Parses not in cache",
+    "adapter_reuses": "Grafts that reused an existing adapter",
+    "adapters_written": "Adapters synthesized",
+    "tokens_generated": "Chat tokens generated",
+    "passages_retrieved": "Corpus passages injected into chat prompts",
+}
+GAUGES = {
+    "tokens_per_second": "Decode rate of the last generation",
+}
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metrics:
+    """
+    Process-wide timing spans, counters and gauges.
+    A span records count / total / last / max seconds per stage; everything
+    is cheap enough to leave on in production and renders as Prometheus
+    text for the /metrics route.
+    """
+    def __init__(self, prefix: str = "genesis"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.spans: Dict[str, List[float]] = {}    # stage -> [count, total, last, max]
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            span = self.spans.get(stage)
+            if span is None:
+                self.spans[stage] = [1, seconds, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                span[2] = seconds
+                span[3] = max(span[3], seconds)
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed_iter(self, stage: str, items: Iterable[T]) -> Iterator[T]:
+        """
+        Yields from items, charging only the time spent producing them to stage
+        (one span per iteration, recorded when it ends or is closed).
+        """
+        it = iter(items)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            self.observe(stage, elapsed)
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "spans": {k: {"count": int(v[0]), "total_s": v[1], "last_s": v[2], "max_s": v[3]}
+                          for k, v in self.spans.items()},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def render_prometheus(self) -> str:
+        snap = self.snapshot()
+        p = self.prefix
+        lines = []
+        if snap["spans"]:
+            lines.append(f"# HELP {p}_stage_seconds Time spent per pipeline stage")
+            lines.append(f"# TYPE {p}_stage_seconds summary")
+            for stage, s in sorted(snap["spans"].items()):
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {s["total_s"]:.6f}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+            lines.append(f"# HELP {p}_stage_last_seconds Duration of the latest span per stage")
+            lines.append(f"# TYPE {p}_stage_last_seconds gauge")
+            for stage, s in sorted(snap["spans"].items()):
+                lines.append(f'{p}_stage_last_seconds{{stage="{stage}"}} {s["last_s"]:.6f}')
+            lines.append(f"# HELP {p}_stage_max_seconds Longest span per stage")
+            lines.append(f"# TYPE {p}_stage_max_seconds gauge")
+            for stage, s in sorted(snap["spans"].items()):
+                lines.append(f'{p}_stage_max_seconds{{stage="{stage}"}} {s["max_s"]:.6f}')
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"# HELP {p}_{name}_total {COUNTERS.get(name, name)}")
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {_fmt(value)}")
+        for name, value in sorted(snap["gauges"].items()):
+            lines.append(f"# HELP {p}_{name} {GAUGES.get(name, name)}")
+            lines.append(f"# TYPE {p}_{name} gauge")
+            lines.append(f"{p}_{name} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+# Shared registry
+metrics = Metrics()
@@ -0,0 +1,88 @@
+import logging
+from typing import Dict, Optional, Tuple
+
+# Configure Logging
+logger = logging.getLogger("ModelIntrospection")
+
+def _field_value(reader, key, default=None):
+    import gguf
+    field = reader.fields.get(key)
+    if field is None or not field.data:
+        return default
+    part = field.parts[field.data[0]]
+    if field.types and field.types[0] == gguf.GGUFValueType.STRING:
+        return bytes(part).decode("utf-8", errors="ignore")
+    return part.tolist()[0]
+
+class ModelGeometry:
+    """
+    Shape facts about a GGUF model, read from its header without loading weights.
+    Tensor shapes are in GGUF order: (n_in, n_out) for 2D weights.
+    """
+    def __init__(self, path, architecture, name, block_count, hidden_dim,
+                 head_count, head_count_kv, head_dim, tensors: Dict[str, Tuple[int, ...]]):
+        self.path = path
+        self.architecture = architecture
+        self.name = name
+        self.block_count = block_count
+        self.hidden_dim = hidden_dim
+        self.head_count = head_count
+        self.head_count_kv = head_count_kv
+        self.head_dim = head_dim
+        self.kv_dim = head_count_kv * head_dim
+        self.tensors = tensors
+
+    def tensor_shape(self, name: str) -> Optional[Tuple[int, ...]]:
+        return self.tensors.get(name)
+
+    def target_layers(self, start=0.3125, stop=0.6875) -> range:
+        """
+        Middle band of blocks for knowledge injection, scaled to the model depth
+        (blocks 10-21 on a 32-block model).
+        """
+        first = int(round(self.block_count * start))
+        last = max(first + 1, int(round(self.block_count * stop)))
+        return range(first, min(last, self.block_count))
+
+    def summary(self) -> str:
+        return (f"{self.architecture} | {self.block_count} blocks | {self.hidden_dim}d "
+                f"| {self.head_count}/{self.head_count_kv} heads")
+
+def inspect_model(model_path: str) -> ModelGeometry:
+    """
+    Reads model geometry from GGUF metadata through a memory-mapped GGUFReader.
+    Raises ValueError if the file is not a usable GGUF model.
+    """
+    import gguf
+    try:
+        reader = gguf.GGUFReader(model_path, 'r')
+    except Exception as e:
+        raise ValueError(f"Not a readable GGUF file: {model_path} ({e})") from e
+
+    arch = _field_value(reader, "general.architecture")
+    if not arch:
+        raise ValueError(f"GGUF file has no general.architecture: {model_path}")
+
+    block_count = _field_value(reader, f"{arch}.block_count")
+    hidden_dim = _field_value(reader, f"{arch}.embedding_length")
+    if not block_count or not hidden_dim:
+        raise ValueError(f"GGUF file is missing {arch} block_count/embedding_length: {model_path}")
+
+    head_count = _field_value(reader, f"{arch}.attention.head_count", 1)
+    head_count_kv = _field_value(reader, f"{arch}.attention.head_count_kv", head_count)
+    head_dim = _field_value(reader, f"{arch}.attention.key_length", hidden_dim // max(head_count, 1))
+
+    tensors = {t.name: tuple(int(d) for d in t.shape) for t in reader.tensors}
+    geometry = ModelGeometry(
+        path=model_path,
+        architecture=arch,
+        name=_field_value(reader, "general.name", ""),
+        block_count=int(block_count),
+        hidden_dim=int(hidden_dim),
+        head_count=int(head_count),
+        head_count_kv=int(head_count_kv),
+        head_dim=int(head_dim),
+        tensors=tensors,
+    )
+    logger.info(f"Model geometry: {geometry.summary()}")
+    return geometry
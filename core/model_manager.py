@@ -0,0 +1,257 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+from core.autotune import load_profile
+from core.metrics import metrics
+
+# Configure Logging
+logger = logging.getLogger("ModelManager")
+
+def _lora_api():
+    """
+    Resolves the runtime LoRA entry points of the installed llama_cpp bindings:
+    (init, set, remove, free), or None if adapters can only be applied at load time.
+    """
+    import llama_cpp
+    if hasattr(llama_cpp, "llama_adapter_lora_init"):
+        return (llama_cpp.llama_adapter_lora_init, llama_cpp.llama_set_adapter_lora,
+                llama_cpp.llama_rm_adapter_lora, llama_cpp.llama_adapter_lora_free)
+    if hasattr(llama_cpp, "llama_lora_adapter_init"):
+        return (llama_cpp.llama_lora_adapter_init, llama_cpp.llama_lora_adapter_set,
+                llama_cpp.llama_lora_adapter_remove, llama_cpp.llama_lora_adapter_free)
+    return None
+
+class ModelManager:
+    """
+    Owns the single llama.cpp load of the base GGUF.
+    One context serves both embedding extraction (toggled into embedding mode
+    on demand) and chat generation, and LoRA adapters are attached to that
+    context at runtime instead of re-reading the weights.
+    Each adapter/scale pair gets its own prompt-state cache, since KV state
+    computed under one adapter is wrong under another.
+    An already built Llama-compatible object can be passed as `llm` (e.g. the
+    benchmark stand-in); it is used as is, without adapters or mode switches.
+    Thread and batch settings not given explicitly come from the host's
+    tuning profile for this model (see core.autotune).
+    """
+    def __init__(self, model_path, n_ctx=4096, n_batch=None, n_threads=None, n_threads_batch=None,
+                 prompt_cache_bytes=1024**3, prompt_cache_dir=None, max_prompt_caches=4, llm=None,
+                 tuning_dir=None):
+        self.model_path = model_path
+        self.profile = load_profile(tuning_dir, model_path if llm is None else None)
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch or self.profile.n_batch
+        self.n_threads = n_threads or self.profile.n_threads
+        self.n_threads_batch = n_threads_batch or self.profile.n_threads_batch
+        self.lock = threading.RLock()
+
+        self._adapters = {}      # path -> llama adapter handle
+        self.active_adapter: Optional[str] = None
+        self.adapter_scale = 1.0
+        self._embed_llm = None   # Dedicated base-weight embedding context, loaded on first use
+        self._embed_lock = threading.Lock()
+        self.prompt_cache_bytes = prompt_cache_bytes
+        self.prompt_cache_dir = prompt_cache_dir
+        self.max_prompt_caches = max_prompt_caches
+        self._prompt_caches = OrderedDict()   # (adapter, scale) -> llama prompt cache
+
+        self._external = llm is not None
+        if llm is None:
+            logger.info(f"Loading base weights once: {model_path}")
+            llm = self._load()
+        self.llm = llm
+        self._use_prompt_cache()
+        self._lora = None if self._external else _lora_api()
+        if self._lora is None and not self._external:
+            logger.warning("llama_cpp has no runtime LoRA API; adapters will require a reload.")
+
+    def _load(self, embedding=False, lora_path=None, n_ctx=None):
+        import llama_cpp
+        from llama_cpp import Llama
+        with metrics.span("model_load"):
+            return Llama(
+                model_path=self.model_path,
+                n_ctx=n_ctx or self.n_ctx,
+                n_batch=self.n_batch,   # Multi-sequence embedding batches are packed up to this size
+                n_ubatch=self.n_batch,
+                embedding=embedding,
+                pooling_type=llama_cpp.LLAMA_POOLING_TYPE_MEAN, # One vector per sequence
+                lora_path=lora_path,
+                n_gpu_layers=0,         # CPU Mode
+                n_threads=self.n_threads,
+                n_threads_batch=self.n_threads_batch,
+                verbose=False
+            )
+
+    def set_threads(self, n_threads, n_threads_batch=None):
+        """
+        Changes decode/batch thread counts on the live context (reloads on old bindings).
+        """
+        with self.lock:
+            self.n_threads = n_threads
+            self.n_threads_batch = n_threads_batch or n_threads
+            if self._external:
+                return
+            import llama_cpp
+            if hasattr(llama_cpp, "llama_set_n_threads"):
+                llama_cpp.llama_set_n_threads(self.llm._ctx.ctx, self.n_threads, self.n_threads_batch)
+                self.llm.context_params.n_threads = self.n_threads
+                self.llm.context_params.n_threads_batch = self.n_threads_batch
+            elif self._adapters:
+                # Loaded adapter handles are bound to the current model object
+                logger.warning("llama_cpp cannot change threads in place; new counts apply on next load")
+            else:
+                self.llm = self._load(lora_path=self.active_adapter)
+                self._use_prompt_cache()
+            with self._embed_lock:
+                if self._embed_llm is not None and hasattr(llama_cpp, "llama_set_n_threads"):
+                    llama_cpp.llama_set_n_threads(self._embed_llm._ctx.ctx, self.n_threads, self.n_threads_batch)
+                else:
+                    self._embed_llm = None   # Reloaded with the new counts on next use
+
+    # --- Prompt Cache ---
+
+    def _use_prompt_cache(self):
+        """
+        Points the context at the prompt cache of the active adapter/scale.
+        """
+        if not self.prompt_cache_bytes:
+            return
+        from core.prompt_cache import make_prompt_cache
+        key = (self.active_adapter, self.adapter_scale)
+        cache = self._prompt_caches.get(key)
+        if cache is None:
+            cache_dir = None
+            if self.prompt_cache_dir:
+                name = hashlib.blake2b(f"{key[0]}|{key[1]}".encode("utf-8"), digest_size=8).hexdigest()
+                cache_dir = os.path.join(self.prompt_cache_dir, name)
+            cache = make_prompt_cache(self.prompt_cache_bytes, cache_dir)
+            self._prompt_caches[key] = cache
+            # RAM caches of adapters not used lately are dropped; disk ones stay on disk
+            while len(self._prompt_caches) > self.max_prompt_caches:
+                self._prompt_caches.popitem(last=False)
+        self._prompt_caches.move_to_end(key)
+        self.llm.set_cache(cache)
+
+    # --- Embedding ---
+
+    # Context size of the dedicated embedding context when it only serves queries
+    QUERY_CTX = 512
+
+    def _embedding_context(self, n_ctx):
+        """
+        Dedicated embedding context on the base weights, grown to at least n_ctx.
+        The GGUF is mmap'd, so the weight pages are shared with the chat context.
+        Call with _embed_lock held.
+        """
+        if self._embed_llm is None or self._embed_llm.n_ctx() < n_ctx:
+            self._embed_llm = None
+            self._embed_llm = self._load(embedding=True, n_ctx=n_ctx)
+        return self._embed_llm
+
+    @contextmanager
+    def embedding_mode(self, query=False):
+        """
+        Yields a context in embedding mode for the duration of the block.
+        Queries go to the small dedicated embedding context, so the chat context
+        keeps its KV prefix; corpus embedding switches the shared context in place
+        when its adapter can be detached at runtime, else also uses the dedicated one.
+        """
+        if query and not self._external:
+            with self._embed_lock:
+                yield self._embedding_context(self.QUERY_CTX)
+            return
+        with self.lock:
+            if self._external:
+                yield self.llm
+                return
+            import llama_cpp
+            if self._lora is None or not hasattr(llama_cpp, "llama_set_embeddings"):
+                # Without runtime LoRA the shared context has the adapter fused into
+                # its weights; older bindings cannot switch it into embedding mode
+                with self._embed_lock:
+                    yield self._embedding_context(self.n_batch)
+                return
+
+            # Embeddings always come from the base weights, so chunk and query
+            # vectors stay comparable whichever adapter a session has active
+            detached = self.active_adapter
+            if detached:
+                self._lora[2](self.llm._ctx.ctx, self._adapters[detached])
+            llama_cpp.llama_set_embeddings(self.llm._ctx.ctx, True)
+            self.llm.context_params.embeddings = True
+            try:
+                yield self.llm
+            finally:
+                llama_cpp.llama_set_embeddings(self.llm._ctx.ctx, False)
+                self.llm.context_params.embeddings = False
+                if detached:
+                    self._lora[1](self.llm._ctx.ctx, self._adapters[detached], float(self.adapter_scale))
+                self.llm.reset()
+
+    def embed(self, texts, query=False, **kwargs):
+        with self.embedding_mode(query) as llm:
+            return llm.embed(texts, **kwargs)
+
+    def tokenize(self, *args, **kwargs):
+        return self.llm.tokenize(*args, **kwargs)
+
+    def detokenize(self, *args, **kwargs):
+        return self.llm.detokenize(*args, **kwargs)
+
+    # --- LoRA Adapters ---
+
+    def _adapter_handle(self, path):
+        handle = self._adapters.get(path)
+        if handle is None:
+            init = self._lora[0]
+            handle = init(self.llm._model.model, path.encode("utf-8"))
+            if not handle:
+                raise RuntimeError(f"Failed to load LoRA adapter: {path}")
+            self._adapters[path] = handle
+        return handle
+
+    def apply_adapter(self, adapter_path, scale=1.0):
+        """
+        Replaces the active adapter with adapter_path at the given scale.
+        """
+        with self.lock:
+            if adapter_path == self.active_adapter and scale == self.adapter_scale:
+                return self.llm
+            if not self._external and adapter_path not in self._adapters and not os.path.exists(adapter_path):
+                raise FileNotFoundError(f"Adapter {os.path.basename(adapter_path)} is no longer on disk; re-graft to rebuild it")
+            if self._external:
+                logger.info(f"Injected model has no adapter support; recording {adapter_path} only")
+            elif self._lora is None:
+                logger.info(f"Reloading model with adapter {adapter_path}")
+                self.llm = self._load(lora_path=adapter_path)
+            else:
+                _, set_adapter, remove_adapter, _ = self._lora
+                handle = self._adapter_handle(adapter_path)
+                if self.active_adapter and self.active_adapter != adapter_path:
+                    remove_adapter(self.llm._ctx.ctx, self._adapters[self.active_adapter])
+                if set_adapter(self.llm._ctx.ctx, handle, float(scale)) != 0:
+                    raise RuntimeError(f"Failed to apply LoRA adapter: {adapter_path}")
+            self.active_adapter = adapter_path
+            self.adapter_scale = scale
+            # Live KV state was computed without this adapter
+            self.llm.reset()
+            self._use_prompt_cache()
+            logger.info(f"Adapter active: {adapter_path} (scale {scale})")
+        return self.llm
+
+    def release_adapter(self, adapter_path):
+        """
+        Frees a loaded adapter handle (e.g. after its file was evicted).
+        The active adapter is kept until it is replaced.
+        """
+        with self.lock:
+            if adapter_path == self.active_adapter:
+                return
+            handle = self._adapters.pop(adapter_path, None)
+            if handle is not None:
+                self._lora[3](handle)
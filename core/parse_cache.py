@@ -0,0 +1,76 @@
+import json
+import zlib
+import hashlib
+import logging
+import threading
+from typing import BinaryIO, Optional
+from core.disk_index import DiskLRUIndex
+from core.metrics import metrics
+
+# Configure Logging
+logger = logging.getLogger("ParseCache")
+
+_HASH_BLOCK = 1 << 20
+
+class ParseCache:
+    """
+    Parse-result cache keyed by (file content hash, parser version, format options).
+    Results are stored as zlib-compressed text blobs next to an LRU index,
+    so re-ingesting the same manual or spreadsheet skips docling, pandas and librosa.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = 1024**3, level: int = 6):
+        self.index = DiskLRUIndex(cache_dir, ".z", max_bytes)
+        self.level = level
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    @staticmethod
+    def hash_stream(stream: BinaryIO) -> Optional[str]:
+        """
+        Hashes a seekable stream and rewinds it; None if it cannot be rewound.
+        """
+        if not (hasattr(stream, 'seekable') and stream.seekable()):
+            return None
+        start = stream.tell()
+        h = hashlib.blake2b(digest_size=20)
+        for block in iter(lambda: stream.read(_HASH_BLOCK), b""):
+            h.update(block)
+        stream.seek(start)
+        return h.hexdigest()
+
+    @staticmethod
+    def key(content_hash: str, version: str, options: Optional[dict] = None) -> str:
+        opts = json.dumps(options or {}, sort_keys=True)
+        return hashlib.blake2b(f"{content_hash}|{version}|{opts}".encode("utf-8"), digest_size=20).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        text = None
+        if self.index.touch(key):
+            try:
+                with open(self.index.path(key), 'rb') as f:
+                    text = zlib.decompress(f.read()).decode("utf-8")
+            except (OSError, zlib.error):
+                self.index.drop(key)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.inc("parse_cache_misses" if text is None else "parse_cache_hits")
+        return text
+
+    def put(self, key: str, text: str):
+        self.index.write(key, zlib.compress(text.encode("utf-8"), self.level))
+        self.index.flush()
+
+    def flush(self):
+        self.index.flush()
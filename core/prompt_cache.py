@@ -0,0 +1,173 @@
+import os
+import pickle
+import hashlib
+import logging
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# Configure Logging
+logger = logging.getLogger("PromptCache")
+
+# Llama 3 chat template pieces
+_BOS = "<|begin_of_text|>"
+_HEADER = "<|start_header_id|>{role}<|end_header_id|>\n\n"
+_EOT = "<|eot_id|>"
+
+def make_prompt_cache(capacity_bytes: int, cache_dir: Optional[str] = None):
+    """
+    Builds a llama.cpp prompt-state cache: disk-backed under cache_dir if given
+    (needs the `diskcache` package), in RAM otherwise. Both evict LRU past capacity_bytes.
+    """
+    from llama_cpp import LlamaRAMCache
+    if cache_dir:
+        try:
+            from llama_cpp import LlamaDiskCache
+            return LlamaDiskCache(cache_dir=cache_dir, capacity_bytes=capacity_bytes)
+        except ImportError as e:
+            logger.warning(f"Disk prompt cache unavailable ({e}); using RAM.")
+    return LlamaRAMCache(capacity_bytes=capacity_bytes)
+
+class Conversation:
+    """
+    Multi-turn chat kept as a token sequence (Llama 3 format).
+    Every turn is tokenized once and earlier turns stay token-identical
+    between requests, so llama.cpp only evaluates what was added since the
+    last reply; the shared prefix comes from the KV state.
+    """
+    def __init__(self, system_prompt: str = ""):
+        self.system_prompt = system_prompt
+        self.turns: List[Tuple[str, str]] = []      # (role, text)
+        self._prefix: Optional[List[int]] = None
+        self._turn_tokens: List[List[int]] = []
+
+    def __len__(self):
+        return len(self.turns)
+
+    def set_system_prompt(self, system_prompt: str):
+        if system_prompt != self.system_prompt:
+            self.system_prompt = system_prompt
+            self._prefix = None
+
+    def clear(self):
+        self.turns.clear()
+        self._turn_tokens.clear()
+
+    @staticmethod
+    def _tokenize(llm, text: str, add_bos: bool = False) -> List[int]:
+        return llm.tokenize(text.encode("utf-8"), add_bos=add_bos, special=True)
+
+    def prefix_tokens(self, llm) -> List[int]:
+        """
+        Tokens of the system block; identical for every turn and every session sharing the persona.
+        """
+        if self._prefix is None:
+            text = _BOS + _HEADER.format(role="system") + self.system_prompt + _EOT
+            self._prefix = self._tokenize(llm, text)
+        return self._prefix
+
+    def _tokens_for(self, llm, index: int) -> List[int]:
+        while len(self._turn_tokens) <= index:
+            role, text = self.turns[len(self._turn_tokens)]
+            self._turn_tokens.append(self._tokenize(llm, _HEADER.format(role=role) + text + _EOT))
+        return self._turn_tokens[index]
+
+    def build_prompt(self, llm, user_msg: str, n_ctx: int, max_tokens: int = 1024,
+                     context: str = "") -> List[int]:
+        """
+        Full prompt for the next reply. Oldest exchanges are dropped while the
+        prompt plus max_tokens would overflow n_ctx. `context` (e.g. retrieved
+        passages) is prepended to this turn only and not kept in the history.
+        """
+        prefix = self.prefix_tokens(llm)
+        pending = self._tokenize(llm, _HEADER.format(role="user") + context + user_msg + _EOT
+                                 + _HEADER.format(role="assistant"))
+        history = [self._tokens_for(llm, i) for i in range(len(self.turns))]
+        budget = n_ctx - max_tokens - len(prefix) - len(pending)
+        start = 0
+        used = sum(len(t) for t in history)
+        while used > budget and start < len(history):
+            # Drop a whole user/assistant exchange at a time
+            for _ in range(2):
+                if start < len(history):
+                    used -= len(history[start])
+                    start += 1
+        if start:
+            logger.info(f"Context full: dropped {start} oldest turn(s) from the prompt")
+        tokens = list(prefix)
+        for t in history[start:]:
+            tokens.extend(t)
+        tokens.extend(pending)
+        return tokens
+
+    def add_exchange(self, user_msg: str, reply: str):
+        self.turns.append(("user", user_msg))
+        self.turns.append(("assistant", reply))
+
+class PersonaStateStore:
+    """
+    Saved KV states of persona system prefixes ("Deep Research" etc.).
+    A state depends on the adapter and its scale as well as the prompt, so
+    it is keyed by all three. States are kept on disk under state_dir and
+    seeded into the context's prompt cache, where llama.cpp picks them up
+    as the longest matching prefix of the first turn.
+    """
+    def __init__(self, state_dir: Optional[str] = None):
+        self.state_dir = state_dir
+        self._states: Dict[str, object] = {}
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    @staticmethod
+    def key(persona: str, adapter_path: Optional[str], scale: float, prefix_tokens: List[int]) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{persona}|{adapter_path}|{scale}|".encode("utf-8"))
+        h.update(array('q', prefix_tokens).tobytes())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Optional[str]:
+        return os.path.join(self.state_dir, f"{key}.state") if self.state_dir else None
+
+    def _load(self, key: str):
+        state = self._states.get(key)
+        path = self._path(key)
+        if state is None and path and os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    state = pickle.load(f)
+                self._states[key] = state
+            except Exception as e:
+                logger.warning(f"Dropping unreadable persona state {path}: {e}")
+                os.remove(path)
+        return state
+
+    def _save(self, key: str, state):
+        self._states[key] = state
+        path = self._path(key)
+        if path:
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+
+    def warm(self, manager, persona: str, prefix_tokens: List[int]) -> bool:
+        """
+        Makes the persona prefix's KV state available to the manager's active
+        context. Returns True if a saved state was restored, False if it was
+        evaluated (and saved) now.
+        """
+        with manager.lock:
+            llm = manager.llm
+            key = self.key(persona, manager.active_adapter, manager.adapter_scale, prefix_tokens)
+            state = self._load(key)
+            restored = state is not None
+            if state is None:
+                llm.reset()
+                llm.eval(prefix_tokens)
+                state = llm.save_state()
+                self._save(key, state)
+            if llm.cache is not None:
+                llm.cache[prefix_tokens] = state
+            else:
+                llm.load_state(state)
+        logger.info(f"Persona '{persona}' {'restored' if restored else 'evaluated'} ({len(prefix_tokens)} tokens)")
+        return restored
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, List, Optional
+
+# Configure Logging
+logger = logging.getLogger("Scheduler")
+
+class GenerationScheduler:
+    """
+    Fair queue in front of a fixed number of llama contexts.
+    Each session waits in its own FIFO and sessions are served round-robin,
+    so one client queuing many prompts cannot starve the others. Contexts are
+    created on first use by context_factory(slot).
+    """
+    def __init__(self, context_factory: Callable[[int], object], max_contexts: int = 1):
+        self._factory = context_factory
+        self.max_contexts = max(1, max_contexts)
+        self._contexts: List[Optional[object]] = [None] * self.max_contexts
+        self._free: Deque[int] = deque(range(self.max_contexts))
+        self._waiting: Dict[str, Deque[asyncio.Future]] = {}
+        self._rotation: Deque[str] = deque()
+        self._create_lock = asyncio.Lock()
+
+    @property
+    def active(self) -> int:
+        return self.max_contexts - len(self._free)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._waiting.values())
+
+    def position(self, session_id: str) -> int:
+        """
+        1-based place of the session's oldest request in the serving order (0 if not queued).
+        """
+        if session_id not in self._waiting:
+            return 0
+        # Round-robin: everyone ahead in the rotation gets one turn per lap
+        ahead = 0
+        for sid in self._rotation:
+            if sid == session_id:
+                break
+            ahead += 1
+        return ahead + 1
+
+    def _dispatch(self):
+        while self._free and self._rotation:
+            sid = self._rotation.popleft()
+            queue = self._waiting[sid]
+            future = queue.popleft()
+            if queue:
+                self._rotation.append(sid)
+            else:
+                del self._waiting[sid]
+            if not future.done():
+                future.set_result(self._free.popleft())
+
+    def _forget(self, session_id: str, future: asyncio.Future):
+        queue = self._waiting.get(session_id)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        if not queue:
+            del self._waiting[session_id]
+            self._rotation.remove(session_id)
+
+    async def _acquire_slot(self, session_id: str) -> int:
+        if self._free and not self._rotation:
+            return self._free.popleft()
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(session_id, deque()).append(future)
+        if session_id not in self._rotation:
+            self._rotation.append(session_id)
+        logger.info(f"Session {session_id[:8]} queued (depth {self.queue_depth})")
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._forget(session_id, future)
+            # Handed a slot just as we were cancelled: give it back
+            if future.done() and not future.cancelled():
+                self._release_slot(future.result())
+            raise
+
+    def _release_slot(self, slot: int):
+        self._free.append(slot)
+        self._dispatch()
+
+    async def _context(self, slot: int):
+        async with self._create_lock:
+            if self._contexts[slot] is None:
+                self._contexts[slot] = await asyncio.to_thread(self._factory, slot)
+        return self._contexts[slot]
+
+    @asynccontextmanager
+    async def lease(self, session_id: str):
+        """
+        Waits for this session's turn and yields an exclusive llama context.
+        """
+        slot = await self._acquire_slot(session_id)
+        try:
+            yield await self._context(slot)
+        finally:
+            self._release_slot(slot)
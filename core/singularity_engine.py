@@ -1,65 +1,213 @@
 import os
+import time
+import itertools
 import numpy as np
 import logging
-from typing import List
-import gguf
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from core.batch_embedder import BatchEmbedder
+from core.chunk_sampler import ChunkSampler
+from core.embedding_cache import EmbeddingCache
+from core.fingerprint import model_fingerprint
+from core.model_manager import ModelManager
+from core.model_introspection import inspect_model
+from core.adapter_registry import AdapterRegistry
+from core.metrics import metrics
 
 # Configure Logging
 logger = logging.getLogger("SingularityCore")
 logging.basicConfig(level=logging.INFO)
 
 class SingularityEngine:
-    def __init__(self, model_path, output_dir="adapters"):
+    def __init__(self, model_path, output_dir="adapters", n_ctx=4096, n_batch: Optional[int] = None,
+                 chunk_tokens: Optional[int] = None, max_chunks: Optional[int] = None,
+                 cache_dir: Optional[str] = None, cache_max_bytes=2 * 1024**3,
+                 manager: Optional[ModelManager] = None, dedupe_threshold: float = 0.8,
+                 tuning_dir: Optional[str] = None):
         self.model_path = model_path
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
+        self._geometry = None
         
         logger.info(f"Initializing Singularity Core with model: {model_path}")
         
-        # Load llama-cpp model for embedding extraction
-        from llama_cpp import Llama
+        # Base weights are loaded once and shared by embedding extraction and chat
         try:
-            self.llm = Llama(
-                model_path=model_path,
-                n_ctx=2048,
-                embedding=True, # Critical for vector extraction
-                verbose=False,
-                n_gpu_layers=0  # Force CPU
-            )
+            self.manager = manager or ModelManager(model_path, n_ctx=n_ctx, n_batch=n_batch,
+                                                   tuning_dir=tuning_dir)
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             raise e
 
+        # Chunking strategy: chunk_tokens per sequence (tuning profile unless given);
+        # max_chunks is the embedding budget per graft (None embeds every distinct chunk)
+        n_batch = n_batch or self.manager.n_batch
+        # A chunk is re-tokenized with a BOS token, so it must stay below n_batch
+        self.chunk_tokens = min(chunk_tokens or self.manager.profile.chunk_tokens, n_batch - 1)
+        self.max_chunks = max_chunks
+        self.sampler = ChunkSampler(budget=max_chunks, threshold=dedupe_threshold)
+        # Tokenize/detokenize/embed go through the manager, which switches modes as needed
+        self.llm = self.manager
+
+        self.fingerprint = model_fingerprint(model_path)
+
+        # Persistent chunk embedding cache (survives restarts, shared across grafts)
+        self.cache = None
+        if cache_dir:
+            self.cache = EmbeddingCache(cache_dir, self.fingerprint, max_bytes=cache_max_bytes)
+
+        # Content-addressed adapters: unchanged grafts reuse their existing file
+        self.registry = AdapterRegistry(self.output_dir, on_evict=self.manager.release_adapter)
+
+        self.embedder = BatchEmbedder(self.llm, n_batch=min(n_ctx, n_batch), cache=self.cache)
+
+    def _token_chunks(self, blocks: Iterable[str], counter: List[int],
+                      spans: Optional[List[Tuple[int, int]]] = None, timed: bool = True) -> Iterator[List[int]]:
+        """
+        Tokenizes text blocks as they stream in and re-cuts them into fixed-size chunks.
+        If `spans` is given, each chunk's (char_start, char_end) in the source is
+        appended to it before the chunk is yielded (token positions are
+        interpolated within their block). `timed=False` leaves the pass out of
+        the tokenize span (re-reads of an already counted source).
+        """
+        max_chunk = self.chunk_tokens
+        buf: List[int] = []
+        pos: List[int] = []     # Char offset of each buffered token (spans only)
+        offset = 0
+        elapsed = 0.0
+        try:
+            for block in blocks:
+                start = time.perf_counter()
+                tokens = self.llm.tokenize(block.encode("utf-8"), add_bos=False)
+                elapsed += time.perf_counter() - start
+                counter[0] += len(tokens)
+                buf.extend(tokens)
+                if spans is not None:
+                    n = len(tokens)
+                    pos.extend(offset + j * len(block) // n for j in range(n))
+                    offset += len(block)
+                start = 0
+                while len(buf) - start >= max_chunk:
+                    if spans is not None:
+                        end = start + max_chunk
+                        spans.append((pos[start], pos[end] if end < len(pos) else offset))
+                    yield buf[start:start + max_chunk]
+                    start += max_chunk
+                del buf[:start]
+                del pos[:start]
+        finally:
+            # Also reached when the consumer stops early
+            if timed:
+                metrics.observe("tokenize", elapsed)
+        if buf:
+            if spans is not None:
+                spans.append((pos[0], offset))
+            yield buf
+
+    def embed_sources(self, sources: Dict[str, Callable[[], Iterable[str]]],
+                      index=None) -> Dict[str, Tuple[np.ndarray, int, int]]:
+        """
+        Embeds several sources as one sampled batch and returns each one's
+        contribution to the lattice: (weighted sum of chunk embeddings, chunk count, token count).
+        `sources` maps a name to a callable returning a fresh iterable of text blocks;
+        each is read twice (sampling, then the chunks picked for embedding).
+        With a VectorIndex, the embedded chunks are also kept there with their text spans.
+        """
+        plan = self.sampler.plan({
+            name: (lambda read=read: self._token_chunks(read(), [0]))
+            for name, read in sources.items()
+        })
+        metrics.inc("tokens_embedded", sum(plan.tokens.values()))
+
+        # Representatives are embedded once, even when several sources share them:
+        # each one is added to the running sum of every source it stands in for
+        users: Dict[int, List[Tuple[str, float]]] = {}
+        for name, weights in plan.weights.items():
+            for cluster, weight in weights.items():
+                users.setdefault(cluster, []).append((name, weight))
+
+        sums: Dict[str, np.ndarray] = {}
+        for name, picks in plan.embed.items():
+            order = sorted(picks)
+            spans: List[Tuple[int, int]] = []
+            chunks = itertools.islice(self._token_chunks(sources[name](), [0], spans, timed=False), order[-1] + 1)
+            wanted = (chunk for idx, chunk in enumerate(chunks) if idx in picks)
+            rows, row_spans = [], []
+            for idx, emb in zip(order, self.embedder.embed_chunks(wanted)):
+                emb64 = emb.astype(np.float64)
+                for source, weight in users.get(picks[idx], ()):
+                    if source in sums:
+                        sums[source] += weight * emb64
+                    else:
+                        sums[source] = weight * emb64
+                if index is not None:
+                    rows.append(emb)
+                    row_spans.append(spans[idx])
+                    if len(rows) >= self.embedder.max_window:
+                        index.add(name, np.stack(rows), row_spans)
+                        rows, row_spans = [], []
+            if rows:
+                index.add(name, np.stack(rows), row_spans)
+
+        return {name: (sums[name], plan.chunks[name], plan.tokens[name])
+                for name in plan.weights if name in sums}
+
+    def embed_source(self, text_data: Union[str, Iterable[str]]):
+        """
+        Embeds one source and returns its contribution to the lattice:
+        (sum of chunk embeddings, chunk count, token count).
+        Accepts a string or an iterable of text blocks (materialized, as it is read twice).
+        """
+        if isinstance(text_data, str):
+            if not text_data.strip():
+                return None, 0, 0
+            blocks = [text_data]
+        else:
+            blocks = list(text_data)
+        result = self.embed_sources({"source": lambda: blocks}).get("source")
+        return result if result is not None else (None, 0, 0)
+
+    def accumulate(self, accumulator, corpus=None, index=None):
+        """
+        Embeds only the sources staged since the last graft into the accumulator.
+        Staged sources without inline text are streamed from the corpus store.
+        All pending sources share one sampling pass, so near-duplicates across
+        sources are embedded once and the budget covers every source.
+        With a VectorIndex, the pending sources' rows are replaced by the new chunks.
+        """
+        sources = {}
+        for name in list(accumulator.pending):
+            if index is not None:
+                index.remove_source(name)
+            text = accumulator.pending[name]
+            if text is None:
+                if corpus is None or corpus.get(name) is None:
+                    accumulator.pending.pop(name, None)
+                    continue
+                sources[name] = lambda name=name: corpus.iter_source(name)
+            else:
+                sources[name] = lambda text=text: [text]
+
+        logger.info(f"Embedding {len(sources)} sources: {', '.join(sources)}")
+        results = self.embed_sources(sources, index=index)
+        for name in sources:
+            accumulator.pending.pop(name, None)
+            if name in results:
+                accumulator.add_source(name, *results[name])
+        return accumulator.vector()
+
     def calculate_concept_vector(self, text_data: str) -> np.ndarray:
         """
         Derives the 'Spectral Lattice' (Concept Vector) from the input data.
         """
         logger.info("Computing Spectral Lattice...")
-        
-        if not text_data.strip():
-            return None
 
-        # Tokenize
-        tokens = self.llm.tokenize(text_data.encode("utf-8"))
-        
-        # Chunking strategy to fit context
-        max_chunk = 512
-        chunks = [tokens[i:i + max_chunk] for i in range(0, len(tokens), max_chunk)]
-        # Limit chunks for speed in "Instant" mode
-        chunks = chunks[:10] 
-        
-        embeddings =
-        for chunk in chunks:
-            if not chunk: continue
-            # Extract embedding
-            emb_list = self.llm.create_embedding(chunk)['data']['embedding']
-            embeddings.append(np.array(emb_list))
-            
-        if not embeddings:
+        pooled_sum, count, n_tokens = self.embed_source(text_data)
+        if pooled_sum is None:
             return None
 
         # Mean Pool: Find the "center of gravity" of the concept
-        concept_vector = np.mean(embeddings, axis=0)
+        concept_vector = pooled_sum / count
+        logger.info(f"Pooled {count} chunks ({n_tokens} tokens).")
         
         # Normalize to unit length
         norm = np.linalg.norm(concept_vector)
@@ -68,84 +216,107 @@ class SingularityEngine:
             
         return concept_vector
 
-    def construct_analytic_lora_gguf(self, concept_vector: np.ndarray, rank=4, alpha=16):
+    @property
+    def geometry(self):
+        """
+        Model geometry from GGUF metadata (read once, no weight load).
+        """
+        if self._geometry is None:
+            self._geometry = inspect_model(self.model_path)
+        return self._geometry
+
+    def construct_analytic_lora_gguf(self, concept_vector: np.ndarray, rank=4, alpha=16, target_layers=None):
         """
         Analytic Weight Steering:
         Constructs a valid GGUF LoRA adapter mathematically.
         It projects the concept vector onto the model's Value (v) and Output (o) projection matrices.
         """
-        logger.info(f"Synthesizing Analytic LoRA (Rank {rank})...")
-        
-        adapter_name = "genesis_graft"
-        save_path = os.path.join(self.output_dir, f"{adapter_name}.gguf")
-        
         # Dimensions
-        dim = concept_vector.shape
+        geometry = self.geometry
+        dim = concept_vector.shape[0]
+        if dim != geometry.hidden_dim:
+            raise ValueError(f"Concept vector has {dim} dims, model hidden size is {geometry.hidden_dim}")
+
+        # Layer Targeting (middle band of blocks for Knowledge Injection),
+        # sized from the model's real block count
+        if target_layers is None:
+            target_layers = geometry.target_layers()
+        target_layers = list(target_layers)
+
+        adapter_key = AdapterRegistry.key(concept_vector, rank, alpha, target_layers, self.fingerprint)
+        existing = self.registry.lookup(adapter_key)
+        if existing:
+            logger.info(f"Reusing Analytic Graft: {existing}")
+            metrics.inc("adapter_reuses")
+            return existing
+
+        with metrics.span("adapter_write"):
+            save_path = self._write_adapter(adapter_key, concept_vector, rank, alpha, target_layers)
+        metrics.inc("adapters_written")
+        return save_path
+
+    def _write_adapter(self, adapter_key, concept_vector, rank, alpha, target_layers):
+        geometry = self.geometry
+        dim = concept_vector.shape[0]
+
+        logger.info(f"Synthesizing Analytic LoRA (Rank {rank})...")
+        save_path = self.registry.path(adapter_key)
         
         # --- Mathematical Construction ---
-        # Matrix B (up-proj): The Concept Vector repeated 'rank' times.
-        # Shape: [dim, rank] -> Flattened for GGUF
-        # We bias the model outputs towards this vector.
-        lora_b_np = np.tile(concept_vector, (rank, 1)).astype(np.float32)
-        
-        # Matrix A (down-proj): Identity-like projection (Trigger).
-        # Shape: [rank, dim]
-        lora_a_np = np.zeros((rank, dim), dtype=np.float32)
-        # Create a sparse identity to distribute effect
-        for r in range(rank):
-            lora_a_np[r, r % dim] = 1.0
-            
         # Scale weights according to LoRA alpha
         scaling = alpha / rank
-        lora_b_np = lora_b_np * scaling
+        
+        # Matrix B (up-proj): The Concept Vector repeated 'rank' times.
+        # Shape: [n_out, rank] -> We bias the model outputs towards this vector.
+        lora_b_np = (np.tile(concept_vector, (rank, 1)).T * scaling).astype(np.float32)
+        
+        def lora_a(n_in):
+            # Matrix A (down-proj): Identity-like projection (Trigger).
+            # Shape: [rank, n_in], a sparse identity to distribute effect
+            a = np.zeros((rank, n_in), dtype=np.float32)
+            for r in range(rank):
+                a[r, r % n_in] = 1.0
+            return a
+
+        targets = []
+        for i in target_layers:
+            # GGUF Tensor Naming Convention: blk.N.attn_v.weight.lora_a
+            # Targets: v_proj (Value) and attn_output (Output)
+            for target in ("attn_v", "attn_output"):
+                name = f"blk.{i}.{target}.weight"
+                shape = geometry.tensor_shape(name)
+                if shape is None or len(shape) != 2:
+                    continue
+                n_in, n_out = shape
+                # The concept lives in the residual stream; skip projections that
+                # write elsewhere (e.g. attn_v under grouped-query attention)
+                if n_out != dim:
+                    logger.info(f"Skipping {name}: output dim {n_out} != {dim}")
+                    continue
+                targets.append((name, n_in))
+
+        if not targets:
+            raise ValueError(f"No compatible projection tensors in layers {target_layers}")
 
         # --- GGUF Writer ---
-        gw = gguf.GGUFWriter(save_path, "llama")
+        import gguf
+        gw = gguf.GGUFWriter(save_path, geometry.architecture)
         
         # Metadata
-        gw.add_string("general.architecture", "llama")
         gw.add_string("general.name", "Genesis-Analytic-Adapter")
-        gw.add_uint32("adapter.lora.alpha", alpha)
-        
-        # Layer Targeting (Middle layers 10-20 for Knowledge Injection)
-        # We assume a standard Llama structure. 
-        # Ideally, we would inspect self.llm to find exact layer count, but 32 is standard for 7B.
-        target_layers = range(10, 22) 
+        gw.add_string("general.type", "adapter")
+        gw.add_string("adapter.type", "lora")
+        gw.add_float32("adapter.lora.alpha", float(alpha))
         
-        for i in target_layers:
-            # Llama 2/3 GGUF Tensor Naming Convention
-            # blk.N.attn_v.weight.lora_a
-            
-            # Target v_proj (Value)
-            gw.add_tensor(f"blk.{i}.attn_v.weight.lora_a", lora_a_np)
-            gw.add_tensor(f"blk.{i}.attn_v.weight.lora_b", lora_b_np)
-            
-            # Target attn_output (Output)
-            gw.add_tensor(f"blk.{i}.attn_output.weight.lora_a", lora_a_np)
-            gw.add_tensor(f"blk.{i}.attn_output.weight.lora_b", lora_b_np)
+        for name, n_in in targets:
+            gw.add_tensor(f"{name}.lora_a", lora_a(n_in))
+            gw.add_tensor(f"{name}.lora_b", lora_b_np)
 
         gw.write_header_to_file()
         gw.write_kv_data_to_file()
         gw.write_tensors_to_file()
         gw.close()
+        self.registry.register(adapter_key)
         
-        logger.info(f"Analytic Graft Saved: {save_path}")
+        logger.info(f"Analytic Graft Saved: {save_path} ({len(targets)} tensor pairs)")
         return save_path
-
-    def get_inference_model(self, adapter_path):
-        """
-        Returns a chat-ready Llama instance with the adapter loaded.
-        """
-        from llama_cpp import Llama
-        
-        # Re-init model with lora_path
-        # Use n_threads to optimize for i7 CPU
-        model = Llama(
-            model_path=self.model_path,
-            n_ctx=4096,
-            n_gpu_layers=0, # CPU Mode
-            verbose=False,
-            lora_path=adapter_path, # Load the analytic graft
-            n_threads=8             # Optimize for i7-4771 (4 core / 8 thread)
-        )
-        return model
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Callable, Iterator, Optional
+
+# Configure Logging
+logger = logging.getLogger("StreamBridge")
+
+_DONE = object()
+
+class TokenStream:
+    """
+    Async bridge over a blocking llama.cpp completion stream.
+    A worker thread runs the model and pushes tokens into a bounded
+    asyncio.Queue, so the event loop only ever awaits the queue.
+    A full queue pauses the worker (backpressure); cancel() stops it
+    between tokens.
+    """
+    def __init__(self, start: Callable[[], Iterator[dict]], max_buffer: int = 64,
+                 lock: Optional[threading.RLock] = None):
+        # start() is called on the worker thread and must return the llama stream
+        self._start = start
+        self._lock = lock
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+        self._cancel = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[BaseException] = None
+        self.finish_reason: Optional[str] = None
+
+    def start(self) -> "TokenStream":
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self._run, name="genesis-generation", daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _put(self, item) -> bool:
+        """
+        Blocks the worker until the queue has room. Returns False if cancelled meanwhile.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if self._cancel.is_set():
+                    future.cancel()
+                    return False
+
+    def _run(self):
+        stream = None
+        try:
+            if self._lock is not None:
+                self._lock.acquire()
+            try:
+                stream = self._start()
+                for output in stream:
+                    if self._cancel.is_set():
+                        break
+                    choice = output['choices'][0]
+                    self.finish_reason = choice.get('finish_reason')
+                    if not self._put(choice['text']):
+                        break
+            finally:
+                if stream is not None and hasattr(stream, 'close'):
+                    stream.close()
+                if self._lock is not None:
+                    self._lock.release()
+        except Exception as e:
+            logger.error(f"Generation failed: {e}")
+            self.error = e
+        finally:
+            # Not awaited: if the consumer already stopped reading, the sentinel just stays queued
+            asyncio.run_coroutine_threadsafe(self._queue.put(_DONE), self._loop)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        item = await self._queue.get()
+        if item is _DONE:
+            if self.error is not None:
+                raise self.error
+            raise StopAsyncIteration
+        return item
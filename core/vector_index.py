@@ -0,0 +1,146 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Configure Logging
+logger = logging.getLogger("VectorIndex")
+
+class VectorIndex:
+    """
+    Chunk-level embedding index for passage retrieval.
+    Vectors are unit-normalised and stored compactly: float16, or int8 with
+    one scale per row (4 KB per chunk at 4096 dims). Each row points back
+    into the CorpusStore by (source, char_start, char_end), so passages are
+    read from the corpus on demand instead of being duplicated here.
+    """
+    DTYPES = ("float16", "int8")
+
+    def __init__(self, dtype: str = "int8", dim: Optional[int] = None, block_rows: int = 65536):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"dtype must be one of {self.DTYPES}, got {dtype}")
+        self.dtype = dtype
+        self.dim = dim
+        self.block_rows = block_rows    # Rows scored per matmul, bounds temporary memory
+        self._n = 0
+        self._vecs: Optional[np.ndarray] = None
+        self._scale = np.zeros(0, dtype=np.float32)
+        self._src = np.zeros(0, dtype=np.int32)
+        self._spans = np.zeros((0, 2), dtype=np.int64)
+        self._names: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def nbytes(self) -> int:
+        if self._vecs is None:
+            return 0
+        return self._n * (self._vecs.itemsize * self.dim + 4 + 4 + 16)
+
+    def _reserve(self, rows: int):
+        capacity = 0 if self._vecs is None else len(self._vecs)
+        if self._n + rows <= capacity:
+            return
+        capacity = max(1024, capacity * 2, self._n + rows)
+        vecs = np.zeros((capacity, self.dim), dtype=self.dtype)
+        scale = np.zeros(capacity, dtype=np.float32)
+        src = np.zeros(capacity, dtype=np.int32)
+        spans = np.zeros((capacity, 2), dtype=np.int64)
+        if self._vecs is not None:
+            vecs[:self._n] = self._vecs[:self._n]
+            scale[:self._n] = self._scale[:self._n]
+            src[:self._n] = self._src[:self._n]
+            spans[:self._n] = self._spans[:self._n]
+        self._vecs, self._scale, self._src, self._spans = vecs, scale, src, spans
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+        peak = np.abs(vectors).max(axis=1)
+        scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        return np.round(vectors / scale[:, None]).astype(np.int8), scale
+
+    def add(self, source: str, vectors: np.ndarray, spans: Sequence[Tuple[int, int]]):
+        """
+        Adds one source's chunk embeddings with their (char_start, char_end) spans.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if len(vectors) != len(spans):
+            raise ValueError(f"{len(vectors)} vectors but {len(spans)} spans")
+        if not len(vectors):
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Index holds {self.dim}-dim vectors, got {vectors.shape[1]}")
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        source_id = self._ids.get(source)
+        if source_id is None:
+            source_id = self._ids[source] = len(self._names)
+            self._names.append(source)
+
+        rows = len(vectors)
+        self._reserve(rows)
+        sl = slice(self._n, self._n + rows)
+        self._vecs[sl], self._scale[sl] = self._encode(vectors)
+        self._src[sl] = source_id
+        self._spans[sl] = np.asarray(spans, dtype=np.int64)
+        self._n += rows
+
+    def remove_source(self, source: str) -> int:
+        """
+        Drops every row of a source; returns the number removed.
+        """
+        source_id = self._ids.get(source)
+        if source_id is None or not self._n:
+            return 0
+        keep = self._src[:self._n] != source_id
+        removed = self._n - int(keep.sum())
+        if removed:
+            n = self._n - removed
+            self._vecs[:n] = self._vecs[:self._n][keep]
+            self._scale[:n] = self._scale[:self._n][keep]
+            self._src[:n] = self._src[:self._n][keep]
+            self._spans[:n] = self._spans[:self._n][keep]
+            self._n = n
+        return removed
+
+    def search(self, queries: np.ndarray, k: int = 4) -> List[List[Tuple[float, str, int, int]]]:
+        """
+        Batched top-k cosine search. Returns, per query, up to k
+        (score, source, char_start, char_end) tuples, best first.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if not self._n or not len(queries):
+            return [[] for _ in range(len(queries))]
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        k = min(k, self._n)
+
+        # Running top-k across row blocks
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, self._n, self.block_rows):
+            end = min(start + self.block_rows, self._n)
+            block = self._vecs[start:end].astype(np.float32)
+            scores = (queries @ block.T) * self._scale[start:end][None, :]
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (len(queries), end - start))], axis=1)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if scores.shape[1] > k else \
+                np.broadcast_to(np.arange(scores.shape[1]), (len(queries), scores.shape[1]))
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_rows = np.take_along_axis(rows, top, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([(float(scores[i]), self._names[self._src[rows[i]]],
+                             int(self._spans[rows[i], 0]), int(self._spans[rows[i], 1]))
+                            for i in order])
+        return results
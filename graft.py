@@ -0,0 +1,147 @@
+"""
+Headless Genesis graft: ingest a directory, build the concept vector,
+write the adapter and exit. Suitable for cron jobs and containers.
+
+    python graft.py data/                         # first model in models/
+    python graft.py data/ -r --model models/x.gguf --json
+
+Nothing from the web UI is imported, and parser backends (pandas, bs4,
+docling, ...) are only loaded for the formats actually found.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+# --- CONFIGURATION (shared with main.py, so caches and adapters are reused) ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+ADAPTER_DIR = os.path.join(BASE_DIR, "adapters")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+EMBED_CACHE_DIR = os.path.join(CACHE_DIR, "embeddings")
+CORPUS_SPILL_DIR = os.path.join(CACHE_DIR, "corpus")
+PARSE_CACHE_DIR = os.path.join(CACHE_DIR, "parsed")
+PARSE_CACHE_MAX_BYTES = 1024**3
+CORPUS_RAM_THRESHOLD = 256 * 1024**2
+TUNING_DIR = os.path.join(CACHE_DIR, "tuning")
+
+logger = logging.getLogger("Graft")
+
+def find_model(model_dir):
+    try:
+        files = sorted(f for f in os.listdir(model_dir) if f.endswith(".gguf"))
+    except OSError:
+        return None
+    return os.path.join(model_dir, files[0]) if files else None
+
+def collect_files(root, recursive, exts):
+    """
+    Files under root with a parseable extension, in a stable order.
+    """
+    if os.path.isfile(root):
+        return [root]
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in exts:
+                found.append(os.path.join(dirpath, name))
+        if not recursive:
+            break
+    return found
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Graft a directory of documents into a LoRA adapter, headless.")
+    ap.add_argument("source", help="Directory (or single file) to ingest")
+    ap.add_argument("-r", "--recursive", action="store_true", help="Descend into subdirectories")
+    ap.add_argument("--model", help="Base GGUF model (default: first .gguf in models/)")
+    ap.add_argument("--out-dir", default=ADAPTER_DIR, help="Adapter registry directory")
+    ap.add_argument("--rank", type=int, default=4)
+    ap.add_argument("--alpha", type=float, default=16)
+    ap.add_argument("--chunk-tokens", type=int, help="Tokens per embedded chunk (default: tuning profile)")
+    ap.add_argument("--budget", type=int, help="Max chunks embedded (default: every distinct chunk)")
+    ap.add_argument("--n-ctx", type=int, default=4096)
+    ap.add_argument("--n-batch", type=int, help="Embedding batch size (default: tuning profile)")
+    ap.add_argument("--workers", type=int, help="Parser processes (default: one per CPU)")
+    ap.add_argument("--csv-stats", action="store_true", help="Add per-column statistics for CSV/TSV (full pass)")
+    ap.add_argument("--no-cache", action="store_true", help="Bypass the parse and embedding caches")
+    ap.add_argument("--json", action="store_true", help="Print a JSON summary instead of the adapter path")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    started = time.perf_counter()
+
+    model_path = args.model or find_model(MODEL_DIR)
+    if not model_path or not os.path.exists(model_path):
+        print("graft: no model found (pass --model or put a .gguf in models/)", file=sys.stderr)
+        return 1
+
+    from core.omni_parser import OmniParser
+    files = collect_files(args.source, args.recursive, OmniParser.SUPPORTED_EXTS)
+    if not files:
+        print(f"graft: no parseable files in {args.source}", file=sys.stderr)
+        return 1
+
+    # 1. Parse (backends load per format, in the worker processes)
+    from core.metrics import metrics
+    from core.parse_cache import ParseCache
+    from core.corpus_store import CorpusStore
+    from core.concept_accumulator import ConceptAccumulator
+    parser = OmniParser(cache=None if args.no_cache else ParseCache(PARSE_CACHE_DIR, max_bytes=PARSE_CACHE_MAX_BYTES),
+                        csv_stats=args.csv_stats)
+    corpus = CorpusStore(CORPUS_SPILL_DIR, ram_threshold=CORPUS_RAM_THRESHOLD)
+    accumulator = ConceptAccumulator()
+    root = args.source if os.path.isdir(args.source) else os.path.dirname(args.source)
+    failed = []
+    try:
+        for path, text in parser.parse_batch(files, max_workers=args.workers):
+            name = os.path.relpath(path, root)
+            if not text or text.startswith(OmniParser.ERROR_PREFIX):
+                logger.warning(f"Skipping {name}: {text or 'no text extracted'}")
+                failed.append(name)
+                continue
+            segment = corpus.add_source(name, text)
+            accumulator.stage(name)
+            metrics.inc("sources_ingested")
+            metrics.inc("bytes_ingested", segment.nbytes)
+        parsed_at = time.perf_counter()
+        if not len(corpus):
+            print("graft: nothing could be parsed", file=sys.stderr)
+            return 1
+
+        # 2. Embed + 3. Construct (model loaded only now)
+        from core.singularity_engine import SingularityEngine
+        engine = SingularityEngine(model_path, args.out_dir, n_ctx=args.n_ctx, n_batch=args.n_batch,
+                                   chunk_tokens=args.chunk_tokens, max_chunks=args.budget,
+                                   cache_dir=None if args.no_cache else EMBED_CACHE_DIR,
+                                   tuning_dir=TUNING_DIR)
+        vector = engine.accumulate(accumulator, corpus)
+        if vector is None:
+            print("graft: vector extraction failed, data too sparse", file=sys.stderr)
+            return 1
+        adapter_path = engine.construct_analytic_lora_gguf(vector, rank=args.rank, alpha=args.alpha)
+    finally:
+        parser.close()
+        corpus.close()
+
+    if args.json:
+        print(json.dumps({
+            "adapter": adapter_path,
+            "model": model_path,
+            "sources": accumulator.names(),
+            "failed": failed,
+            "chunks": accumulator.chunk_count,
+            "tokens": accumulator.token_count,
+            "parse_s": parsed_at - started,
+            "total_s": time.perf_counter() - started,
+            "metrics": metrics.snapshot(),
+        }, indent=2))
+    else:
+        print(adapter_path)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())